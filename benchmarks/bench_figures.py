@@ -0,0 +1,119 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+import plotly.express as px
+from plotly.io.json import to_json_plotly
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import ROOT
+
+import figures
+from data_loader import load_dataset
+from filter_engine import FilterEngine
+from map_layer import MapLayer
+
+
+# plotly.express path: one px call per chart on the filtered rows
+def express(filtered_df, summary):
+    bar_fig = px.bar(
+        filtered_df,
+        x="uni",
+        y=["total_admitted"],
+        title="Number of Admiited in 2566",
+        labels={"uni": "University", "value": "Number of Admiited"},
+        barmode="relative",
+    )
+    line_fig = px.line(
+        filtered_df,
+        x="uni",
+        y=["total_admitted"],
+        title="Trend of Admiited in 2566",
+        labels={"uni": "University", "value": "Number of Admiited"},
+    )
+    average_success_rate = filtered_df["success_rate"].mean()
+    pie_fig = px.pie(
+        pd.DataFrame(
+            {
+                "label": ["Success", "Fail"],
+                "value": [average_success_rate, 100 - average_success_rate],
+            }
+        ),
+        names="label",
+        values="value",
+        title="Success Rate Distribution of Graduates in 2566",
+    )
+    color_column, _ = figures.MARKER_MODES["admitted"]
+    map_fig = px.scatter_mapbox(
+        summary,
+        lat="lat",
+        lon="lon",
+        hover_name="uni",
+        custom_data=["uni", "programmes", "total_admitted", "fee", "success_rate"],
+        color=color_column,
+        color_continuous_scale=px.colors.sequential.Sunsetdark,
+        size="programmes",
+        size_max=25,
+        zoom=5,
+        height=450,
+    )
+    map_fig.update_traces(marker=dict(opacity=0.7, sizemin=6))
+    map_fig.update_layout(mapbox_style="open-street-map")
+    return [fig.to_dict() for fig in (bar_fig, line_fig, pie_fig, map_fig)]
+
+
+# figures path: prebuilt layouts filled from the per-university summary
+def builders(filtered_df, summary):
+    return [
+        figures.bar_figure(summary, "2566"),
+        figures.trend_figure(["2566"], [int(summary["total_admitted"].sum())]),
+        figures.pie_figure(filtered_df["success_rate"].mean(), "2566"),
+        figures.map_figure(summary, "admitted", 13.7, 100.5, 5),
+    ]
+
+
+# Best wall time of building the four figures, then of serializing them
+def best_time(path, filtered_df, summary, repeat):
+    build, serialize = float("inf"), float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = path(filtered_df, summary)
+        middle = time.perf_counter()
+        payload = sum(len(to_json_plotly(fig)) for fig in result)
+        build = min(build, middle - start)
+        serialize = min(serialize, time.perf_counter() - middle)
+    return build, serialize, payload
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="plotly.express vs figures")
+    parser.add_argument(
+        "--data", default=os.path.join(ROOT, "data", "data_mark_01.csv")
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base = load_dataset(args.data)
+    print(
+        f"{'rows':>8} {'path':>8} {'build':>9} {'to_json':>9} {'total':>9}"
+        f" {'bytes':>9}"
+    )
+    for scale in args.scales:
+        df = pd.concat([base] * scale, ignore_index=True)
+        for column in ["uni", "major", "minor", "course"]:
+            df[column] = df[column].astype("category")
+        rows = FilterEngine(df).select(["all"], "all", "all")
+        filtered_df = df.iloc[rows]
+        summary = MapLayer(df).summarize(rows)
+
+        for name, path in [("express", express), ("figures", builders)]:
+            build, serialize, payload = best_time(
+                path, filtered_df, summary, args.repeat
+            )
+            print(
+                f"{len(df):>8} {name:>8} {build * 1000:>7.1f}ms"
+                f" {serialize * 1000:>7.1f}ms {(build + serialize) * 1000:>7.1f}ms"
+                f" {payload:>9}"
+            )
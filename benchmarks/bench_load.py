@@ -0,0 +1,96 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import ROOT
+
+import data_loader
+
+# Measures one load in a fresh interpreter and prints it as JSON. RSS counts
+# the file-backed pages of the memory-mapped Arrow file (shared), so in a
+# single process the Arrow path can show a higher RSS than the CSV path; it
+# saves load time and private memory, which each worker pays for separately.
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+import data_loader
+
+def status():
+    fields = {{}}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0])
+    return fields
+
+before = status()
+start = time.perf_counter()
+df = data_loader.load_dataset({dataset!r})
+seconds = time.perf_counter() - start
+after = status()
+print(json.dumps({{
+    "seconds": seconds,
+    "rss": after["VmRSS"] - before["VmRSS"],
+    "anon": after["RssAnon"] - before["RssAnon"],
+    "file": after["RssFile"] - before["RssFile"],
+}}))
+"""
+
+
+# Prepared dataset scaled up by repeating the rows with distinct course names
+def scaled_dataset(scale):
+    base = pd.read_csv(os.path.join(ROOT, "data/data_mark_01.csv"))
+    copies = []
+    for copy in range(scale):
+        df = base.copy()
+        if copy:
+            df["course"] = df["course"] + f" ({copy})"
+        copies.append(df)
+    return pd.concat(copies, ignore_index=True)
+
+
+# Best of several cold-interpreter loads of one dataset file
+def measure(dataset, repeat):
+    code = CHILD.format(path=os.path.join(ROOT, "mytcas_dashboard"), dataset=dataset)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(output.stdout))
+    return min(runs, key=lambda run: run["seconds"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CSV vs Arrow load time and RSS")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if data_loader.pa is None:
+        sys.exit("pyarrow is not installed")
+
+    print(
+        f"{'rows':>8} {'format':>6} {'load':>9} {'RSS':>9} {'private':>9}"
+        f" {'shared':>9}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            df = scaled_dataset(scale)
+            csv_path = os.path.join(tmp, f"data_{scale}.csv")
+            arrow_path = os.path.join(tmp, f"data_{scale}.arrow")
+            df.to_csv(csv_path, index=False)
+            data_loader.write_arrow(df, arrow_path)
+            for name, path in [("csv", csv_path), ("arrow", arrow_path)]:
+                run = measure(path, args.repeat)
+                print(
+                    f"{len(df):>8} {name:>6} {run['seconds'] * 1000:>7.1f}ms"
+                    f" {run['rss'] / 1024:>7.1f}MB {run['anon'] / 1024:>7.1f}MB"
+                    f" {run['file'] / 1024:>7.1f}MB"
+                )
@@ -0,0 +1,53 @@
+import argparse
+import contextlib
+import io
+import time
+
+import pandas as pd
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import BASE_ROWS, make_export
+
+import data_preparation
+
+
+# Multi-pass path: clean() then adjust_fee() re-parsing the raw fee
+def multi_pass(convert_df, combine_df):
+    cleaned_df = data_preparation.clean(convert_df)
+    return data_preparation.adjust_fee(combine_df, cleaned_df)
+
+
+# Fused path: parse_fields() on convert_df only
+def fused(convert_df, combine_df):
+    return data_preparation.parse_fields(convert_df)
+
+
+# Best wall time of a stage over several runs on fresh copies of its inputs
+def best_time(stage, convert_df, combine_df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        convert_copy, combine_copy = convert_df.copy(), combine_df.copy()
+        start = time.perf_counter()
+        result = stage(convert_copy, combine_copy)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="clean+adjust_fee vs parse_fields")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'multi-pass':>11} {'fused':>9} {'speedup':>8}")
+    for scale in args.scales:
+        with contextlib.redirect_stdout(io.StringIO()):
+            export = make_export(BASE_ROWS * scale)
+            convert_df, combine_df = data_preparation.filter(export)
+            old_time, old = best_time(multi_pass, convert_df, combine_df, args.repeat)
+            new_time, new = best_time(fused, convert_df, combine_df, args.repeat)
+        pd.testing.assert_frame_equal(old, new)
+        print(
+            f"{len(export):>8} {old_time * 1000:>9.1f}ms {new_time * 1000:>7.1f}ms"
+            f" {old_time / new_time:>7.2f}x"
+        )
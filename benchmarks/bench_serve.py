@@ -0,0 +1,150 @@
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import ROOT
+
+import data_loader
+
+# Callback posted by every request: the KPI cards of one university. The
+# server runs with its result and HTTP caches off (MYTCAS_CACHE_SIZE=0),
+# otherwise the few distinct bodies would be answered from the caches after
+# the warm-up and the rate would not depend on the callbacks or the workers.
+KPI_OUTPUTS = [
+    {"id": "success-rate-value", "property": "children"},
+    {"id": "fee-value", "property": "children"},
+    {"id": "admitted-value", "property": "children"},
+]
+
+
+def kpi_request(year, university):
+    selection = {
+        "year": year,
+        "uni": [university],
+        "major": "all",
+        "course": "all",
+        "last": university,
+    }
+    return json.dumps(
+        {
+            "output": "..success-rate-value.children...fee-value.children"
+            "...admitted-value.children..",
+            "outputs": KPI_OUTPUTS,
+            "inputs": [
+                {"id": "selection-store", "property": "data", "value": selection}
+            ],
+            "changedPropIds": ["selection-store.data"],
+        }
+    )
+
+
+def post(port, body):
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request(
+        "POST",
+        "/_dash-update-component",
+        body,
+        {"Content-Type": "application/json"},
+    )
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.status
+
+
+# Proportional set size (kB) of the server and its workers: shared pages are
+# split between the processes sharing them
+def total_pss(pid):
+    pids = [pid]
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        pids += [int(child) for child in f.read().split()]
+    total = 0
+    for process in pids:
+        with open(f"/proc/{process}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    total += int(line.split()[1])
+    return total, len(pids) - 1
+
+
+# Requests per second of concurrent clients over a fixed duration
+def load(port, bodies, clients, seconds):
+    done = [0] * clients
+    errors = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(number):
+        i = number
+        while time.perf_counter() < deadline:
+            if post(port, bodies[i % len(bodies)]) == 200:
+                done[number] += 1
+            else:
+                errors[number] += 1
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / seconds, sum(errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Throughput and memory of serve.py per worker count"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    partitions = data_loader.find_partitions(
+        os.path.join(ROOT, "data", "years"),
+        os.path.join(ROOT, "data", "data_mark_01.csv"),
+    )
+    year = max(partitions)
+    df = data_loader.load_dataset(partitions[year])
+    universities = list(df["uni"].cat.categories)
+    bodies = [kpi_request(year, university) for university in universities]
+
+    print(f"cpus {os.cpu_count()}")
+    print(f"{'workers':>7} {'req/s':>8} {'errors':>6} {'PSS':>9}")
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "serve.py",
+                "--workers",
+                str(workers),
+                "--port",
+                str(args.port),
+            ],
+            cwd=os.path.join(ROOT, "mytcas_dashboard"),
+            env={**os.environ, "MYTCAS_CACHE_SIZE": "0"},
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            # Wait until every worker is up
+            for _ in range(300):
+                try:
+                    post(args.port, bodies[0])
+                    if total_pss(server.pid)[1] == workers:
+                        break
+                except (ConnectionError, OSError):
+                    pass
+                time.sleep(0.1)
+            load(args.port, bodies, args.clients, 1)  # warm up the workers
+            rate, errors = load(args.port, bodies, args.clients, args.seconds)
+            pss, _ = total_pss(server.pid)
+            print(f"{workers:>7} {rate:>8.0f} {errors:>6} {pss / 1024:>7.1f}MB")
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import ROOT
+
+# Measures one cold start in a fresh interpreter and prints it as JSON
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+dashboard = app.create_app({config!r})
+created = time.perf_counter()
+client = dashboard.server.test_client()
+assert client.get("/").status_code == 200
+assert client.get("/_dash-layout").status_code == 200
+served = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_page": served - created,
+}}))
+"""
+
+
+# Best of several cold starts, run from the filesystem root so that nothing
+# depends on the working directory
+def measure(config, repeat):
+    code = CHILD.format(path=os.path.join(ROOT, "mytcas_dashboard"), config=config)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.abspath(os.sep),
+        )
+        runs.append(json.loads(output.stdout))
+    return {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start time of create_app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=300,
+        help="budget of create_app plus the first page load (data and layout)",
+    )
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'import':>9} {'create':>9} {'first page':>11} {'startup':>9}")
+    over = False
+    for name, config in [("lazy", {}), ("preload", {"preload": True})]:
+        run = measure(config, args.repeat)
+        startup = (run["create_app"] + run["first_page"]) * 1000
+        over = over or startup > args.budget_ms
+        print(
+            f"{name:>8} {run['import'] * 1000:>7.1f}ms"
+            f" {run['create_app'] * 1000:>7.1f}ms {run['first_page'] * 1000:>9.1f}ms"
+            f" {startup:>7.1f}ms"
+        )
+    print(f"budget {args.budget_ms:.0f}ms: {'over' if over else 'ok'}")
+    sys.exit(1 if over else 0)
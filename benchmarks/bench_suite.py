@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# synthetic puts mytcas_dashboard on sys.path
+from synthetic import BASE_ROWS, make_export
+
+import aggregate_cube
+import data_loader
+import data_preparation
+from app import create_app
+
+# Regressions smaller than this are noise, whatever the ratio
+MIN_REGRESSION_MS = 5
+
+
+# Wall time (best of repeat) and peak traced memory of stage(*make_args()).
+# Every run gets fresh arguments since some stages modify their input, and
+# memory is measured in a separate run so tracing does not skew the timing.
+def measure(stage, make_args, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        args = make_args()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = stage(*args)
+            best = min(best, time.perf_counter() - start)
+
+    args = make_args()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stage(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": best * 1000, "peak_mb": peak / 1024 / 1024}, result
+
+
+# Time each pipeline stage on a synthetic export of n_rows rows, then write
+# the prepared dataset (CSV, Arrow and cube cells) to data_dir for the callbacks
+def bench_pipeline(n_rows, data_dir, repeat):
+    export = make_export(n_rows)
+    results = {}
+    csv_path = os.path.join(data_dir, "data_mark_01.csv")
+
+    results["filter"], (convert_df, combine_df) = measure(
+        data_preparation.filter, lambda: (export.copy(),), repeat
+    )
+    results["clean"], cleaned_df = measure(
+        data_preparation.clean, lambda: (convert_df.copy(),), repeat
+    )
+    results["adjust_fee"], _ = measure(
+        data_preparation.adjust_fee,
+        lambda: (combine_df.copy(), cleaned_df.copy()),
+        repeat,
+    )
+    results["parse_fields"], parsed_df = measure(
+        data_preparation.parse_fields, lambda: (convert_df.copy(),), repeat
+    )
+    results["merge_latlong"], df_merged = measure(
+        data_preparation.merge_latlong, lambda: (parsed_df.copy(),), repeat
+    )
+    results["save_as_csv"], _ = measure(
+        data_preparation.save_as_csv, lambda: (df_merged, csv_path), repeat
+    )
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_preparation.save_as_arrow(
+            df_merged, data_preparation.arrow_path(csv_path)
+        )
+        data_preparation.save_cube_cells(
+            aggregate_cube.cube_cells(df_merged), data_loader.cube_path(csv_path)
+        )
+    return results, df_merged
+
+
+# Filter states a user typically goes through, from the whole year down to
+# one programme
+def filter_states(df):
+    top = df["uni"].value_counts().index
+    first = df[df["uni"] == top[0]].iloc[0]
+    return {
+        "all": (["all"], "all", "all"),
+        "university": ([top[0]], "all", "all"),
+        "major": ([top[0]], first["major"], "all"),
+        "course": ([top[0]], first["major"], first["course"]),
+        "five_universities": (list(top[:5]), "all", "all"),
+    }
+
+
+# Body of a /_dash-update-component request
+def request(outputs, inputs, state=None):
+    output = outputs[0] if len(outputs) == 1 else f"..{'...'.join(outputs)}.."
+    outputs = [dict(zip(("id", "property"), o.split("."))) for o in outputs]
+    body = {
+        "output": output,
+        "outputs": outputs[0] if len(outputs) == 1 else outputs,
+        "inputs": [
+            {"id": i.split(".")[0], "property": i.split(".")[1], "value": value}
+            for i, value in inputs
+        ],
+        "changedPropIds": [inputs[0][0]],
+    }
+    if state:
+        body["state"] = [
+            {"id": s.split(".")[0], "property": s.split(".")[1], "value": value}
+            for s, value in state
+        ]
+    return body
+
+
+# Time every server-side callback for each filter state through the Dash
+# endpoint, without the result cache so every request computes
+def bench_callbacks(df, data_dir, repeat):
+    app = create_app({"data_dir": data_dir, "cache_size": 0})
+    client = app.server.test_client()
+    client.get("/")
+    year = app.partitions.years[-1]
+
+    def post(body):
+        response = client.post("/_dash-update-component", json=body)
+        assert response.status_code in (200, 204), response.data[:200]
+        return response
+
+    results = {}
+    for name, (universities, major, course) in filter_states(df).items():
+        dropdowns = [
+            ("year-dropdown.value", year),
+            ("university-dropdown.value", universities),
+            ("major-dropdown.value", major),
+            ("course-dropdown.value", course),
+        ]
+        select = request(
+            ["selection-store.data"], dropdowns, [("selection-store.data", None)]
+        )
+        selection = post(select).get_json()["response"]["selection-store"]["data"]
+        store = [("selection-store.data", selection)]
+        callbacks = {
+            "selection": select,
+            "options": request(
+                ["university-dropdown.options", "major-dropdown.options"],
+                dropdowns,
+            ),
+            "course_search": request(
+                ["course-dropdown.options"],
+                dropdowns + [("course-dropdown.search_value", "วิศวกรรม")],
+            ),
+            "kpis": request(
+                [
+                    "success-rate-value.children",
+                    "fee-value.children",
+                    "admitted-value.children",
+                ],
+                store,
+            ),
+            "bar_chart": request(["university-bar-chart.figure"], store),
+            "pie_chart": request(["major-pie-chart.figure"], store),
+            "trend_chart": request(["university-line-chart.figure"], store),
+            "map": request(["map-data.data"], store),
+            "table": request(
+                ["data-table.data", "data-table.page_count", "data-table.page_current"],
+                store
+                + [
+                    ("data-table.page_current", 0),
+                    ("data-table.page_size", 10),
+                    ("data-table.sort_by", [{"column_id": "fee", "direction": "desc"}]),
+                    ("data-table.filter_query", ""),
+                ],
+            ),
+        }
+        for callback, body in callbacks.items():
+            results[f"{callback}[{name}]"], _ = measure(post, lambda: (body,), repeat)
+
+    check_filter_query(df, post, year)
+    return results
+
+
+# The DataTable prefixes every filter operator with "s" (case-sensitive) or
+# "i" (case-insensitive): check that such a query filters the table rows as
+# pandas does
+def check_filter_query(df, post, year):
+    courses = df["course"].astype(str)
+    word = next(w for w in " ".join(courses).split() if w.isascii() and w.isalpha())
+    university = df.loc[courses.str.contains(word), "uni"].iloc[0]
+    fee = int(df["fee"].median())
+    filter_query = (
+        f"{{fee}} s> {fee} && {{uni}} scontains {university}"
+        f" && {{course}} icontains {word.swapcase()}"
+    )
+    rows = (
+        (df["fee"] > fee)
+        & df["uni"].astype(str).str.contains(university, regex=False)
+        & courses.str.casefold().str.contains(word.casefold(), regex=False)
+    ).sum()
+    assert rows < len(df), filter_query
+    state = [
+        ("university-dropdown.value", ["all"]),
+        ("major-dropdown.value", "all"),
+        ("course-dropdown.value", "all"),
+    ]
+    select = request(
+        ["selection-store.data"],
+        [("year-dropdown.value", year)] + state,
+        [("selection-store.data", None)],
+    )
+    selection = post(select).get_json()["response"]["selection-store"]["data"]
+    body = request(
+        ["data-table.data", "data-table.page_count", "data-table.page_current"],
+        [
+            ("selection-store.data", selection),
+            ("data-table.page_current", 0),
+            ("data-table.page_size", 1),
+            ("data-table.sort_by", []),
+            ("data-table.filter_query", filter_query),
+        ],
+    )
+    table = post(body).get_json()["response"]["data-table"]
+    assert table["page_count"] == max(1, rows), (filter_query, table["page_count"])
+
+
+# Timings of results that got slower than the baseline by more than tolerance
+def regressions(results, baseline, tolerance):
+    slower = []
+    for scale, stages in results.items():
+        for stage, run in stages.items():
+            before = baseline.get(scale, {}).get(stage)
+            if before is None:
+                continue
+            if (
+                run["ms"] > before["ms"] * tolerance
+                and run["ms"] - before["ms"] > MIN_REGRESSION_MS
+            ):
+                slower.append((scale, stage, before["ms"], run["ms"]))
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time and peak memory of the pipeline stages and callbacks"
+    )
+    parser.add_argument(
+        "--scales", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="slowdown ratio against the baseline reported as a regression",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'rows':>8} {'stage':<34} {'time':>10} {'peak':>10}")
+    for scale in args.scales:
+        n_rows = BASE_ROWS * scale
+        with tempfile.TemporaryDirectory() as data_dir:
+            pipeline, df = bench_pipeline(n_rows, data_dir, args.repeat)
+            callbacks = bench_callbacks(df, data_dir, args.repeat)
+        results[str(scale)] = {**pipeline, **callbacks}
+        for stage, run in results[str(scale)].items():
+            print(
+                f"{n_rows:>8} {stage:<34} {run['ms']:>8.1f}ms"
+                f" {run['peak_mb']:>8.1f}MB"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for scale, stage, before, after in slower:
+            print(f"Regression at {scale}x: {stage} {before:.1f}ms -> {after:.1f}ms")
+        sys.exit(1 if slower else 0)
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "mytcas_dashboard"))
+
+# Number of rows in the current engineering-only dataset
+BASE_ROWS = 650
+SCRAPER_URL = "https://course.mytcas.com/"
+
+# Programmes of other faculties, dropped by data_preparation.filter
+OTHER_FACULTIES = [
+    ("คณะแพทยศาสตร์", "แพทยศาสตร์", "หลักสูตรแพทยศาสตรบัณฑิต (ภาษาไทย ปกติ)"),
+    ("คณะวิทยาศาสตร์", "เคมี", "หลักสูตรวิทยาศาสตรบัณฑิต สาขาวิชาเคมี (ภาษาไทย ปกติ)"),
+    ("คณะบริหารธุรกิจ", "การตลาด", "หลักสูตรบริหารธุรกิจบัณฑิต สาขาวิชาการตลาด (ภาษาไทย ปกติ)"),
+    ("คณะนิติศาสตร์", "นิติศาสตร์", "หลักสูตรนิติศาสตรบัณฑิต (ภาษาไทย ปกติ)"),
+]
+
+
+# Fee text as it appears on the programme pages
+def fee_text(fee, whole_programme, rng):
+    if fee == 0:
+        return None if rng.random() < 0.5 else "ไม่ระบุค่าใช้จ่าย"
+    if whole_programme:
+        return f"ค่าใช้จ่ายตลอดหลักสูตร {fee:,} บาท"
+    return f"ค่าใช้จ่ายต่อภาคการศึกษา {max(fee // 8, 1):,} บาท"
+
+
+# Generate a scraper export shaped like data/tcas.csv with n_rows rows. Thai
+# names come from the prepared dataset; fee, success rate and round columns
+# are rendered back into the raw text the scraper collects.
+def make_export(n_rows, seed=0, dataset="data/data_mark_01.csv"):
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(os.path.join(ROOT, dataset))
+    sample = base.iloc[rng.integers(0, len(base), n_rows)].reset_index(drop=True)
+
+    engineering = rng.random(n_rows) < 0.6
+    other = [OTHER_FACULTIES[i] for i in rng.integers(0, len(OTHER_FACULTIES), n_rows)]
+    major = np.where(engineering, sample["major"], [o[0] for o in other])
+    minor = np.where(engineering, sample["minor"], [o[1] for o in other])
+    course = np.where(engineering, sample["course"], [o[2] for o in other])
+    number = rng.integers(1, 20, n_rows).astype(str)
+    whole_programme = rng.random(n_rows) < 0.5
+
+    export = {
+        "web-scraper-order": [f"1700000000-{i}" for i in range(n_rows)],
+        "web-scraper-start-url": SCRAPER_URL,
+        "uni": sample["uni"],
+        "uni-href": SCRAPER_URL + "universities/" + sample["uni"],
+        "major": np.char.add(np.char.add(number, ". "), major.astype(str)),
+        "major-href": SCRAPER_URL + "faculties/" + pd.Series(major),
+        "minor": minor,
+        "minor-href": SCRAPER_URL + "fields/" + pd.Series(minor),
+        "course": course,
+        "course-href": [f"{SCRAPER_URL}programs/{i}" for i in range(n_rows)],
+        "course_name": course,
+        "fee": [
+            fee_text(fee, whole, rng)
+            for fee, whole in zip(sample["fee"], whole_programme)
+        ],
+        "success_rate": [
+            f"อัตราการสำเร็จการศึกษา {rate}%" if rate else None
+            for rate in sample["success_rate"]
+        ],
+    }
+    for column in ["round1", "round2", "round3", "round4"]:
+        export[column] = [
+            f"รับ {seats} คน" if seats else None for seats in sample[column]
+        ]
+    return pd.DataFrame(export)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic tcas.csv")
+    parser.add_argument("--scale", type=int, default=1, help="multiple of 650 rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="data/tcas.csv")
+    args = parser.parse_args()
+
+    make_export(BASE_ROWS * args.scale, args.seed).to_csv(args.output, index=False)
+    print(f"Wrote {BASE_ROWS * args.scale} rows to {args.output}")
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from data_loader import ROUND_COLUMNS
+
+# Measures summed in the cube, next to the row count
+MEASURES = ["success_rate", "fee", "total_admitted"]
+# Dimensions of a cell
+DIMENSIONS = ["major", "course", "uni"]
+# Code of the "all" member of the major and course dimensions (-1 is the
+# code of missing values)
+ALL = -2
+
+
+# Row count and sums of MEASURES per (major, course, uni) cell of a dataset,
+# prepared or loaded, with the names of the members. Cells of parts of a
+# dataset are added up by combine_cube_cells.
+def cube_cells(df):
+    rows = df[DIMENSIONS].copy()
+    rows["count"] = 1
+    for measure in MEASURES:
+        if measure == "total_admitted" and measure not in df.columns:
+            values = df[ROUND_COLUMNS].sum(axis=1)
+        else:
+            values = df[measure]
+        rows[measure] = values.astype(np.int64)
+    groups = rows.groupby(DIMENSIONS, sort=False, observed=True, dropna=False)
+    return groups.sum().reset_index()
+
+
+def combine_cube_cells(parts):
+    groups = pd.concat(parts, ignore_index=True).groupby(
+        DIMENSIONS, sort=False, dropna=False
+    )
+    return groups.sum().reset_index()
+
+
+# Aggregate cube built from the cube_cells of a dataset, either when its
+# partition loads or from the cells data_preparation writes next to it. It
+# holds the row count and the sums of MEASURES per (major, course, uni) cell,
+# plus the rollups with major and/or course set to "all". A selection is
+# answered by adding up the partial aggregates of its universities, never by
+# touching the rows.
+class AggregateCube:
+    def __init__(self, cells):
+        cells = cells.copy()
+        self.categories = {}
+        for column in DIMENSIONS:
+            members = pd.Categorical(cells[column])
+            self.categories[column] = members.categories
+            cells[column] = members.codes
+        cells[MEASURES] = cells[MEASURES].astype(np.float64)
+
+        # Cells and their rollups over major, course and both
+        levels = []
+        for all_majors in (False, True):
+            for all_courses in (False, True):
+                level = cells.copy()
+                if all_majors:
+                    level["major"] = ALL
+                if all_courses:
+                    level["course"] = ALL
+                levels.append(level.groupby(["major", "course", "uni"]).sum())
+        cube = pd.concat(levels).sort_index()
+
+        # (major, course) -> (university codes, [count, *MEASURES] per university,
+        # totals over every university)
+        keys = cube.index.droplevel("uni").to_numpy()
+        universities = cube.index.get_level_values("uni").to_numpy()
+        values = cube[["count"] + MEASURES].to_numpy(dtype=np.float64)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        self.entries = {
+            keys[start]: (
+                universities[start:end],
+                values[start:end],
+                values[start:end].sum(axis=0),
+            )
+            for start, end in zip(starts, ends)
+        }
+
+        # Approximate in-memory size: the member names and the entry arrays
+        self.nbytes = sum(
+            int(categories.memory_usage(deep=True))
+            for categories in self.categories.values()
+        )
+        for entry in self.entries.values():
+            self.nbytes += sum(array.nbytes for array in entry)
+
+    # Code of a dimension member, ALL for "all" and None when it is unknown
+    def code(self, column, value):
+        if value == "all":
+            return ALL
+        try:
+            return self.categories[column].get_loc(value)
+        except KeyError:
+            return None
+
+    # Row count and MEASURES sums of a selection, as a dict
+    def totals(self, selected_university, selected_major, selected_course):
+        totals = np.zeros(1 + len(MEASURES))
+        key = (
+            self.code("major", selected_major),
+            self.code("course", selected_course),
+        )
+        entry = self.entries.get(key)
+        if entry is not None:
+            universities, values, everything = entry
+            if "all" in selected_university:
+                totals = everything
+            else:
+                codes = [self.code("uni", value) for value in selected_university]
+                keep = np.isin(universities, [c for c in codes if c is not None])
+                totals = values[keep].sum(axis=0)
+        return dict(zip(["count"] + MEASURES, totals))
@@ -1,550 +1,1189 @@
 # Import packages
-from dash import Dash, html, dcc, callback, Output, Input, dash_table
+from dash import Dash, DiskcacheManager, html, dcc, Output, Input, State, dash_table
+from dash import ctx, no_update
 import dash_bootstrap_components as dbc
-import plotly.express as px
-import pandas as pd
-import json
-import plotly.graph_objects as go
-# from data.university import university_coords
-
-# Load data from CSV file
-data = pd.read_csv("data/data_mark_01.csv")
-# Create DataFrame from CSV data
-df = pd.DataFrame(data)
-# df["lat"] = df["uni"].map(
-#     lambda x: university_coords[x]["lat"] if x in university_coords else None
-# )
-# df["lon"] = df["uni"].map(
-#     lambda x: university_coords[x]["lon"] if x in university_coords else None
-# )
-
-# Initialize the Dash app with a dark theme
-app = Dash(external_stylesheets=[dbc.themes.DARKLY])
-
-# URL for the Plotly logo
-PLOTLY_LOGO = "https://images.plot.ly/logo/new-branding/plotly-logomark.png"
-
-# Define the navigation bar
-navbar = dbc.Navbar(
-    dbc.Container(
-        [
-            html.A(
-                dbc.Row(
-                    [
-                        dbc.Col(html.Img(src=PLOTLY_LOGO, height="30px")),
-                        dbc.Col(dbc.NavbarBrand("Dashboard", className="ms-2")),
-                    ],
-                    align="center",
-                    className="g-0",
-                ),
-                href="https://plotly.com",
-                style={"textDecoration": "none"},
-            ),
-        ]
-    ),
-    color="dark",
-    dark=True,
+import flask
+import functools
+import os
+import resource
+import time
+from data_loader import dataset_version, find_partitions
+from figures import MARKER_MODES, bar_figure, map_figure, pie_figure, trend_figure
+from figures import TEMPLATE, province_bar_figure, province_map_figure
+from http_cache import HttpCache
+from metrics import Metrics, Profiler, metrics_path
+from partitions import PartitionStore
+from result_cache import ResultCache
+from table_query import apply_filter_query, apply_sort_by, page_records
+
+# diskcache (with multiprocess and psutil, which Dash uses to run the jobs) is
+# optional, without it every callback runs in the request thread
+try:
+    import diskcache
+    import multiprocess  # noqa: F401
+    import psutil  # noqa: F401
+except ImportError:
+    diskcache = None
+
+# Data directory of the repository, so the app does not depend on the
+# working directory it is started from
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
 )
+# Course options sent to the browser at a time, the others are found by
+# typing in the dropdown, which searches on the server
+COURSE_OPTIONS_LIMIT = 50
+# Largest page of /api/search
+SEARCH_PAGE_SIZE_MAX = 100
 
-# Define the header section
-header = html.Div(
-    children=[
-        html.H1(
-            children="Number Of Admitted Dashboard 2566",
-            style={
-                "textAlign": "center",  # Center text horizontally
-                "margin": "20px auto",  # Add margin to center the element horizontally
-                "width": "100%",  # Make the H1 take the full width
-            },
-        ),
-        html.P(
-            children="Number of admitted from Mytcas website",
-            style={
-                "textAlign": "center",  # Center text horizontally
-                "width": "100%",  # Make the paragraph take the full width
-            },
+
+# Settings of create_app. Every setting can also come from the environment
+# variable next to it; values passed to create_app take precedence.
+def load_config(config=None):
+    env = os.environ
+    settings = {
+        # Directory holding data_mark_01.csv and the years/ partitions
+        "data_dir": env.get("MYTCAS_DATA_DIR", DATA_DIR),
+        # Memory budget of the loaded years in MB
+        "memory_budget": int(env.get("MYTCAS_MEMORY_BUDGET", 512)),
+        # Size (entries) and time-to-live (seconds) of the result cache
+        "cache_size": int(env.get("MYTCAS_CACHE_SIZE", 256)),
+        "cache_ttl": float(env["MYTCAS_CACHE_TTL"])
+        if env.get("MYTCAS_CACHE_TTL")
+        else None,
+        # Load the latest year and build the layout in create_app instead of
+        # on the first page load
+        "preload": env.get("MYTCAS_PRELOAD") == "1",
+        # Directory of the diskcache that runs the expensive renders as
+        # background callbacks, None to render in the request thread
+        "background_dir": env.get("MYTCAS_BACKGROUND_DIR"),
+        # Smallest response body (bytes) worth compressing
+        "compress_min_size": int(env.get("MYTCAS_COMPRESS_MIN_SIZE", 500)),
+        # Directory to write a cProfile and a tracemalloc snapshot of callback
+        # requests to (one at a time, overlapping requests are skipped), None
+        # to not profile
+        "profile_dir": env.get("MYTCAS_PROFILE_DIR"),
+    }
+    settings.update(config or {})
+    return settings
+
+
+# Create the dashboard app. Nothing is read here apart from the list of
+# year partitions: the latest year is loaded and the layout built on the
+# first page load (or right away with preload), and every other year on
+# first use.
+def create_app(config=None):
+    config = load_config(config)
+
+    # Datasets of every admission year, each loaded on first use as a
+    # compact, dictionary-encoded DataFrame (memory-mapped from the Arrow file
+    # when available) with its filter index, aggregate cube, map layer and
+    # sort orders. Years over the memory budget are evicted, least recently
+    # used first.
+    partitions = PartitionStore(
+        find_partitions(
+            os.path.join(config["data_dir"], "years"),
+            os.path.join(config["data_dir"], "data_mark_01.csv"),
         ),
-    ]
-)
+        config["memory_budget"] * 1024 * 1024,
+    )
+
+    # Cache of callback results per normalized filter state
+    result_cache = ResultCache(maxsize=config["cache_size"], ttl=config["cache_ttl"])
+
+    # Version of every dataset, which results are cached by
+    def dataset_versions():
+        return [dataset_version(path) for path in partitions.paths.values()]
+
+    # Background jobs run in their own process and keep their results in the
+    # diskcache, per dataset version
+    manager = None
+    if config["background_dir"]:
+        if diskcache is None:
+            print("Render in the request thread: diskcache is not installed")
+        else:
+            manager = DiskcacheManager(
+                diskcache.Cache(config["background_dir"]),
+                cache_by=[dataset_versions],
+                expire=config["cache_ttl"],
+            )
+
+    # Initialize the Dash app with a dark theme
+    app = Dash(
+        __name__,
+        external_stylesheets=[dbc.themes.DARKLY],
+        background_callback_manager=manager,
+    )
+    app.partitions = partitions
+    app.result_cache = result_cache
+    app.metrics = Metrics()
+
+    # The layout is built once, on first use, and served as-is afterwards
+    app.layout = functools.cache(
+        lambda: build_layout(partitions, manager is not None)
+    )
+    register_callbacks(
+        app, partitions, result_cache, app.metrics, manager is not None
+    )
+
+    # Compressed responses with ETags versioned by the datasets. Repeated
+    # callback requests get a 304 or the cached body of their last response.
+    app.http_cache = HttpCache(
+        dataset_versions,
+        maxsize=config["cache_size"],
+        ttl=config["cache_ttl"],
+        min_size=config["compress_min_size"],
+    )
+    # Flask runs after_request hooks in reverse order of registration: the
+    # cache compresses after the metrics have recorded the payload and the
+    # serialization time of a callback. Its before_request, which answers
+    # cached requests, runs after the metrics start timing the request.
+    app.server.after_request(app.http_cache.after_request)
+    register_metrics(app, config["profile_dir"])
+    register_search(app)
+    app.server.before_request(app.http_cache.before_request)
+    if config["preload"]:
+        app.layout()
+    return app
+
+
+# Time every request and record the payload size and serialization time of
+# the callbacks, and serve them with the pipeline metrics of each year and the
+# state of the caches on /metrics in the Prometheus text format. With a
+# profile directory, every callback request is also profiled.
+def register_metrics(app, profile_dir=None):
+    server = app.server
+    metrics = app.metrics
+    profiler = Profiler(profile_dir) if profile_dir else None
+
+    @server.before_request
+    def start_request():
+        flask.g.metrics_start = time.perf_counter()
+        if profiler is not None and flask.request.path == "/_dash-update-component":
+            flask.g.metrics_profile = profiler.start()
 
-# Create options for the university dropdown, including "Select All"
-university_options = [{"label": "Select All", "value": "all"}] + [
-    {"label": university, "value": university} for university in df["uni"].unique()
-]
-
-# Create options for the major dropdown, including "All"
-major_options = [{"label": "Select All", "value": "all"}] + [
-    {"label": major, "value": major} for major in df["major"].unique()
-]
-
-# Create options for the course dropdown, including "All"
-course_options = [{"label": "Select All", "value": "all"}] + [
-    {"label": course, "value": course} for course in df["course"].unique()
-]
-
-# Define the filter section with dropdowns for university, major, and sorting
-filter = html.Div(
-    [
-        dbc.Row(
+    @server.after_request
+    def record_request(response):
+        now = time.perf_counter()
+        rule = flask.request.url_rule
+        metrics.observe(
+            "http_request_seconds",
+            now - flask.g.get("metrics_start", now),
+            rule=rule.rule if rule else "unmatched",
+        )
+        # Set by the callback wrapper: Dash serializes the result after it
+        callback = flask.g.get("metrics_callback")
+        if callback is not None:
+            metrics.observe(
+                "callback_serialize_seconds",
+                now - flask.g.metrics_callback_end,
+                callback=callback,
+            )
+            metrics.observe(
+                "callback_payload_bytes",
+                response.content_length or 0,
+                callback=callback,
+            )
+        profile = flask.g.pop("metrics_profile", None)
+        if profile is not None:
+            profiler.stop(profile, callback or "callback")
+        return response
+
+    # A request that failed before its response was made still has to let
+    # the next one be profiled
+    @server.teardown_request
+    def stop_profile(error):
+        profile = flask.g.pop("metrics_profile", None)
+        if profile is not None:
+            profiler.stop(profile, "failed")
+
+    @server.route("/metrics")
+    def metrics_route():
+        report = Metrics()
+        report.merge(metrics)
+        # Written by data_preparation next to each dataset
+        for year, path in app.partitions.paths.items():
+            if os.path.exists(metrics_path(path)):
+                report.merge(Metrics.load(metrics_path(path)), year=year)
+        caches = {
+            "result_cache": app.result_cache,
+            "response_cache": app.http_cache.responses,
+        }
+        for prefix, cache in caches.items():
+            cache_stats = cache.stats()
+            for name in ["hits", "misses", "evictions"]:
+                report.inc(f"{prefix}_{name}", cache_stats[name])
+            for name in ["size", "maxsize"]:
+                report.set(f"{prefix}_{name}", cache_stats[name])
+        partition_stats = app.partitions.stats()
+        for name in ["loads", "evictions"]:
+            report.inc(f"partitions_{name}", partition_stats[name])
+        for name in ["nbytes", "memory_budget"]:
+            report.set(f"partitions_{name}", partition_stats[name])
+        report.set("partitions_loaded", len(partition_stats["loaded"]))
+        report.set(
+            "process_peak_rss_bytes",
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        )
+        return flask.Response(
+            report.render(), mimetype="text/plain; version=0.0.4"
+        )
+
+
+# Search the course, major and minor names of a year on the server:
+#   GET /api/search?q=<text>&year=<year>&column=<course|major|minor>
+#                  &page=<page>&page_size=<size>
+# returns one page of matches, best first, and the number of matches. The
+# year defaults to the latest and the column to all three.
+def register_search(app):
+    partitions = app.partitions
+
+    @app.server.route("/api/search")
+    def search_route():
+        args = flask.request.args
+        year = args.get("year", partitions.years[-1])
+        if year not in partitions.paths:
+            return flask.jsonify(error=f"unknown year {year}"), 404
+        try:
+            page = max(int(args.get("page", 0)), 0)
+            page_size = int(args.get("page_size", 20))
+        except ValueError:
+            return flask.jsonify(error="page and page_size must be integers"), 400
+        page_size = min(max(page_size, 1), SEARCH_PAGE_SIZE_MAX)
+        query = args.get("q", "")
+        column = args.get("column")
+        results, total = partitions.get(year).search.page(
+            query, column, page, page_size
+        )
+        return flask.jsonify(
+            query=query,
+            year=year,
+            column=column,
+            page=page,
+            page_size=page_size,
+            total=total,
+            results=results,
+        )
+
+
+# Build the app layout. Its dropdown options, title and table columns come
+# from the latest year, which this loads.
+def build_layout(partitions, background=False):
+    years = partitions.years
+    latest_year = years[-1]
+    df = partitions.get(latest_year).df
+    table_columns = partitions.get(latest_year).table_columns
+    # URL for the Plotly logo
+    PLOTLY_LOGO = "https://images.plot.ly/logo/new-branding/plotly-logomark.png"
+
+    # Define the navigation bar
+    navbar = dbc.Navbar(
+        dbc.Container(
             [
-                dbc.Col(
-                    html.Div(
+                html.A(
+                    dbc.Row(
                         [
-                            html.H6(
-                                "University", style={"marginBottom": "10px"}
-                            ),  # Header for the university dropdown
-                            dcc.Dropdown(
-                                id="university-dropdown",
-                                options=university_options,
-                                value=["all"],  # Default value is "Select All"
-                                multi=True,
-                                style={
-                                    "width": "100%",
-                                    "color": "black",
-                                    "backgroundColor": "white",
-                                },
-                            ),
-                        ]
+                            dbc.Col(html.Img(src=PLOTLY_LOGO, height="30px")),
+                            dbc.Col(dbc.NavbarBrand("Dashboard", className="ms-2")),
+                        ],
+                        align="center",
+                        className="g-0",
                     ),
-                    width=6,
-                    style={"padding": "0 10px"},
+                    href="https://plotly.com",
+                    style={"textDecoration": "none"},
                 ),
-                dbc.Col(
-                    html.Div(
-                        [
-                            html.H6(
-                                "Major", style={"marginBottom": "10px"}
-                            ),  # Header for the major dropdown
-                            dcc.Dropdown(
-                                id="major-dropdown",
-                                options=major_options,
-                                value="all",  # Default value is "All"
-                                style={
-                                    "width": "100%",
-                                    "color": "black",
-                                    "backgroundColor": "white",
-                                },
-                            ),
-                        ]
+            ]
+        ),
+        color="dark",
+        dark=True,
+    )
+
+    # Define the header section
+    header = html.Div(
+        children=[
+            html.H1(
+                id="dashboard-title",
+                children=f"Number Of Admitted Dashboard {latest_year}",
+                style={
+                    "textAlign": "center",  # Center text horizontally
+                    "margin": "20px auto",  # Add margin to center the element horizontally
+                    "width": "100%",  # Make the H1 take the full width
+                },
+            ),
+            html.P(
+                children="Number of admitted from Mytcas website",
+                style={
+                    "textAlign": "center",  # Center text horizontally
+                    "width": "100%",  # Make the paragraph take the full width
+                },
+            ),
+        ]
+    )
+
+    # Create options for the university dropdown, including "Select All"
+    university_options = [{"label": "Select All", "value": "all"}] + [
+        {"label": university, "value": university} for university in df["uni"].unique()
+    ]
+
+    # Create options for the major dropdown, including "All"
+    major_options = [{"label": "Select All", "value": "all"}] + [
+        {"label": major, "value": major} for major in df["major"].unique()
+    ]
+
+    # Create options for the course dropdown, including "All". Only the
+    # first courses are sent, the others are searched on the server.
+    course_options = [{"label": "Select All", "value": "all"}] + [
+        {"label": course, "value": course}
+        for course in df["course"].unique()[:COURSE_OPTIONS_LIMIT]
+    ]
+
+    # Create options for the year dropdown, latest year first
+    year_options = [{"label": year, "value": year} for year in reversed(years)]
+
+    # Define the filter section with dropdowns for university, major, and sorting
+    filter = html.Div(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H6(
+                                    "University", style={"marginBottom": "10px"}
+                                ),  # Header for the university dropdown
+                                dcc.Dropdown(
+                                    id="university-dropdown",
+                                    options=university_options,
+                                    value=["all"],  # Default value is "Select All"
+                                    multi=True,
+                                    style={
+                                        "width": "100%",
+                                        "color": "black",
+                                        "backgroundColor": "white",
+                                    },
+                                ),
+                            ]
+                        ),
+                        width=6,
+                        style={"padding": "0 10px"},
                     ),
-                    width=3,
-                    style={"padding": "0 5px"},
-                ),
-                dbc.Col(
-                    html.Div(
-                        [
-                            html.H6(
-                                "Course", style={"marginBottom": "10px"}
-                            ),  # Header for the course dropdown
-                            dcc.Dropdown(
-                                id="course-dropdown",
-                                options=course_options,
-                                value="all",  # Default value is "All"
-                                style={
-                                    "width": "100%",
-                                    "color": "black",
-                                    "backgroundColor": "white",
-                                },
-                            ),
-                        ]
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H6(
+                                    "Major", style={"marginBottom": "10px"}
+                                ),  # Header for the major dropdown
+                                dcc.Dropdown(
+                                    id="major-dropdown",
+                                    options=major_options,
+                                    value="all",  # Default value is "All"
+                                    style={
+                                        "width": "100%",
+                                        "color": "black",
+                                        "backgroundColor": "white",
+                                    },
+                                ),
+                            ]
+                        ),
+                        width=3,
+                        style={"padding": "0 5px"},
                     ),
-                    width=3,
-                    style={"padding": "0 10px"},
-                ),
-            ],
-            align="center",
-            style={"margin": "0"},
-        ),
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H6(
+                                    "Course", style={"marginBottom": "10px"}
+                                ),  # Header for the course dropdown
+                                dcc.Dropdown(
+                                    id="course-dropdown",
+                                    options=course_options,
+                                    value="all",  # Default value is "All"
+                                    style={
+                                        "width": "100%",
+                                        "color": "black",
+                                        "backgroundColor": "white",
+                                    },
+                                ),
+                            ]
+                        ),
+                        width=3,
+                        style={"padding": "0 10px"},
+                    ),
+                ],
+                align="center",
+                style={"margin": "0"},
+            ),
 
-        # Radio button
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div(
+            # Year dropdown and radio button
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H6(
+                                    "Year", style={"marginBottom": "10px"}
+                                ),  # Header for the year dropdown
+                                dcc.Dropdown(
+                                    id="year-dropdown",
+                                    options=year_options,
+                                    value=latest_year,  # Default is the latest year
+                                    clearable=False,
+                                    style={
+                                        "width": "100%",
+                                        "color": "black",
+                                        "backgroundColor": "white",
+                                    },
+                                ),
+                            ]
+                        ),
+                        width=3,
+                        style={"padding": "0 10px"},
+                    ),
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H6(
+                                    "Marker Mode", style={"marginBottom": "10px"}
+                                ),  # Header for the radio buttons
+                                dcc.RadioItems(
+                                    id="marker-mode",
+                                    options=[
+                                        {"label": "Admitted", "value": "admitted"},
+                                        {"label": "Fee", "value": "fee"},
+                                        {"label": "Success Rate", "value": "success_rate"},
+                                    ],
+                                    value="admitted",  # Default value
+                                    inline=True,
+                                    style={
+                                        "color": "black",
+                                        "backgroundColor": "white",
+                                        "padding": "5px",
+                                        "borderRadius": "5px",
+                                    },
+                                ),
+                            ]
+                        ),
+                        width=9,
+                        style={"padding": "0 10px"},
+                    ),
+                ],
+                align="center",
+                style={"margin": "10px 0"},
+            ),
+        ]
+    )
+
+    # Status of the renders running in the background, only shown when they
+    # do (otherwise the bar never moves and there is nothing to cancel)
+    if background:
+        filter.children.append(
+            dbc.Row(
+                [
+                    dbc.Col(
+                        dbc.Progress(
+                            id="render-progress",
+                            value=0,
+                            style={"height": "20px"},
+                        ),
+                        width=9,
+                        style={"padding": "0 10px"},
+                    ),
+                    dbc.Col(
                         [
-                            html.H6(
-                                "Marker Mode", style={"marginBottom": "10px"}
-                            ),  # Header for the radio buttons
-                            dcc.RadioItems(
-                                id="marker-mode",
-                                options=[
-                                    {"label": "Admitted", "value": "admitted"},
-                                    {"label": "Fee", "value": "fee"},
-                                    {"label": "Success Rate", "value": "success_rate"},
-                                ],
-                                value="admitted",  # Default value
-                                inline=True,
-                                style={
-                                    "color": "black",
-                                    "backgroundColor": "white",
-                                    "padding": "5px",
-                                    "borderRadius": "5px",
-                                },
+                            html.Span(
+                                id="render-status", style={"marginRight": "10px"}
                             ),
-                        ]
+                            dbc.Button(
+                                "Cancel",
+                                id="cancel-render",
+                                size="sm",
+                                color="secondary",
+                                disabled=True,
+                            ),
+                        ],
+                        width=3,
+                        style={"padding": "0 10px", "textAlign": "right"},
                     ),
-                    width=12,
-                    style={"padding": "0 10px"},
-                ),
-            ],
-            align="center",
-            style={"margin": "10px 0"},
-        ),
-    ]
-)
+                ],
+                align="center",
+                style={"margin": "10px 0"},
+            )
+        )
 
-output = html.Div(
-    [
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div(
-                        [
-                            dbc.Row(
-                                html.Div(
-                                    [
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.H4(
-                                                        "Success Rate",
-                                                        className="card-title",
-                                                    ),
-                                                    html.P(
-                                                        id="success-rate-value",
-                                                        className="card-text",
-                                                        style={"fontSize": "24px"},
-                                                    ),
-                                                ]
+    output = html.Div(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div(
+                            [
+                                dbc.Row(
+                                    html.Div(
+                                        [
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.H4(
+                                                            "Success Rate",
+                                                            className="card-title",
+                                                        ),
+                                                        html.P(
+                                                            id="success-rate-value",
+                                                            className="card-text",
+                                                            style={"fontSize": "24px"},
+                                                        ),
+                                                    ]
+                                                ),
+                                                style={
+                                                    "flex": "1",
+                                                    "marginBottom": "10px",
+                                                    "width": "100%",
+                                                },
                                             ),
-                                            style={
-                                                "flex": "1",
-                                                "marginBottom": "10px",
-                                                "width": "100%",
-                                            },
-                                        ),
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.H4(
-                                                        "Fee",
-                                                        className="card-title",
-                                                    ),
-                                                    html.P(
-                                                        id="fee-value",
-                                                        className="card-text",
-                                                        style={"fontSize": "24px"},
-                                                    ),
-                                                ]
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.H4(
+                                                            "Fee",
+                                                            className="card-title",
+                                                        ),
+                                                        html.P(
+                                                            id="fee-value",
+                                                            className="card-text",
+                                                            style={"fontSize": "24px"},
+                                                        ),
+                                                    ]
+                                                ),
+                                                style={
+                                                    "flex": "1",
+                                                    "marginBottom": "10px",
+                                                    "width": "100%",
+                                                },
+                                            ),
+                                            dbc.Card(
+                                                dbc.CardBody(
+                                                    [
+                                                        html.H4(
+                                                            "Admitted",
+                                                            className="card-title",
+                                                        ),
+                                                        html.P(
+                                                            id="admitted-value",
+                                                            className="card-text",
+                                                            style={"fontSize": "24px"},
+                                                        ),
+                                                    ]
+                                                ),
+                                                style={
+                                                    "flex": "1",
+                                                    "marginBottom": "10px",
+                                                    "width": "100%",
+                                                },
                                             ),
+                                        ],
+                                        style={
+                                            "display": "flex",
+                                            "flexDirection": "row",
+                                            "gap": "10px",
+                                            "justifyContent": "center",  # Centering cards horizontally
+                                        },
+                                    ),
+                                    style={
+                                        "padding": "0 10px",
+                                        "justifyContent": "center",  # Centering the row
+                                    },
+                                ),
+                                dbc.Col(
+                                    [
+                                        dbc.Row(
+                                            html.Div([dcc.Graph(id="map-graph")]),
                                             style={
-                                                "flex": "1",
-                                                "marginBottom": "10px",
+                                                "paddingLeft": "0 20px",
                                                 "width": "100%",
+                                                "flex": "1",
+                                                "margin": "0 auto",
                                             },
                                         ),
-                                        dbc.Card(
-                                            dbc.CardBody(
-                                                [
-                                                    html.H4(
-                                                        "Admitted",
-                                                        className="card-title",
-                                                    ),
-                                                    html.P(
-                                                        id="admitted-value",
-                                                        className="card-text",
-                                                        style={"fontSize": "24px"},
-                                                    ),
-                                                ]
+                                        dbc.Row(
+                                            html.Div(
+                                                [dcc.Graph(id="university-bar-chart")]
                                             ),
                                             style={
-                                                "flex": "1",
-                                                "marginBottom": "10px",
+                                                "paddingRight": "0 20px",
                                                 "width": "100%",
+                                                "flex": "1",
+                                                "margin": "0 auto",
                                             },
                                         ),
                                     ],
                                     style={
+                                        "gap": "2",
                                         "display": "flex",
-                                        "flexDirection": "row",
-                                        "gap": "10px",
-                                        "justifyContent": "center",  # Centering cards horizontally
+                                        "width": "100%",
+                                        "margin": "0 auto",
                                     },
                                 ),
-                                style={
-                                    "padding": "0 10px",
-                                    "justifyContent": "center",  # Centering the row
-                                },
-                            ),
-                            dbc.Col(
-                                [
-                                    dbc.Row(
-                                        html.Div([dcc.Graph(id="map-graph")]),
-                                        style={
-                                            "paddingLeft": "0 20px",
-                                            "width": "100%",
-                                            "flex": "1",
-                                            "margin": "0 auto",
-                                        },
-                                    ),
-                                    dbc.Row(
-                                        html.Div(
-                                            [dcc.Graph(id="university-bar-chart")]
-                                        ),
-                                        style={
-                                            "paddingRight": "0 20px",
-                                            "width": "100%",
-                                            "flex": "1",
-                                            "margin": "0 auto",
-                                        },
-                                    ),
-                                ],
-                                style={
-                                    "gap": "2",
-                                    "display": "flex",
-                                    "width": "100%",
-                                    "margin": "0 auto",
-                                },
-                            ),
-                        ],
+                            ],
+                            style={
+                                "textAlign": "center",  # Center text if needed
+                            },
+                        ),
+                        width=12,  # Full width column for centering
+                    ),
+                ],
+                style={"padding": "20px 0", "margin": "0 auto"},
+            )
+        ]
+    )
+
+    # Define the additional output section with more charts and a data table
+    additional_output = html.Div(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div([dcc.Graph(id="major-pie-chart")]),
+                        width=4,  # Width of the first column
                         style={
-                            "textAlign": "center",  # Center text if needed
-                        },
+                            "padding": "0 10px"
+                        },  # Add padding to prevent content from being too close to the edges
                     ),
-                    width=12,  # Full width column for centering
-                ),
+                    dbc.Col(
+                        html.Div([dcc.Graph(id="university-line-chart")]),
+                        width=4,  # Width of the second column
+                        style={
+                            "padding": "0 10px"
+                        },  # Add padding to prevent content from being too close to the edges
+                    ),
+                    dbc.Col(
+                        html.Div(
+                            [
+                                dash_table.DataTable(
+                                    id="data-table",
+                                    columns=[
+                                        {"name": col, "id": col}
+                                        for col in table_columns
+                                    ],
+                                    style_table={"overflowX": "auto"},
+                                    style_cell={"textAlign": "left"},
+                                    page_size=10,
+                                    # Page, sort and filter on the server so only
+                                    # the current page is sent to the browser
+                                    page_current=0,
+                                    page_action="custom",
+                                    sort_action="custom",
+                                    sort_mode="multi",
+                                    sort_by=[],
+                                    filter_action="custom",
+                                    filter_query="",
+                                )
+                            ]
+                        ),
+                        width=4,  # Width of the third column
+                        style={
+                            "padding": "0 10px"
+                        },  # Add padding to prevent content from being too close to the edges
+                    ),
+                ],
+                style={
+                    "padding": "20px 0",
+                    "color": "black",
+                    "margin": "0 auto",
+                },  # Add padding to the row
+            )
+        ]
+    )
+
+    # Province view: admission seats against graduating students per province
+    province_output = html.Div(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div([dcc.Graph(id="province-map")]),
+                        width=5,
+                        style={"padding": "0 10px"},
+                    ),
+                    dbc.Col(
+                        html.Div([dcc.Graph(id="province-bar-chart")]),
+                        width=7,
+                        style={"padding": "0 10px"},
+                    ),
+                ],
+                style={"padding": "20px 0", "margin": "0 auto"},
+            )
+        ]
+    )
+
+    # Define the app layout to include the navbar, header, filters, and output sections
+    return html.Div(
+        children=[
+            navbar,
+            header,
+            filter,
+            output,
+            additional_output,  # Add the new output section to the layout
+            province_output,
+            dcc.Store(id="selection-store"),  # Normalized filter state
+            dcc.Store(id="map-data"),  # Map figure and per-university metrics
+            dcc.Store(
+                id="marker-modes",  # Color column and scale of each marker mode
+                data={
+                    mode: {"column": column, "colorscale": colorscale}
+                    for mode, (column, colorscale) in MARKER_MODES.items()
+                },
+            ),
+        ]
+    )
+
+
+# Register the callbacks of an app on its year partitions and result cache.
+# With background, the renders over a whole selection run as background
+# callbacks instead of blocking a request thread.
+def register_callbacks(app, partitions, result_cache, metrics, background=False):
+    years = partitions.years
+
+    # Decorator timing a callback. In a request it also marks the request, so
+    # the payload size and serialization time are recorded once Dash has
+    # built the response (background jobs run in their own process, so only
+    # their request to start or poll the job is recorded).
+    def instrumented(name):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                with metrics.timer("callback_seconds", callback=name):
+                    result = func(*args)
+                if flask.has_request_context():
+                    flask.g.metrics_callback = name
+                    flask.g.metrics_callback_end = time.perf_counter()
+                return result
+
+            return wrapper
+
+        return decorator
+
+    # Timer of a section (filter, aggregate, figure...) of a callback or of
+    # a helper shared by several callbacks
+    def timed(callback, section):
+        return metrics.timer(
+            "callback_section_seconds", callback=callback, section=section
+        )
+
+    # Callback options of a render that runs in the background: it shows its
+    # status and can be cancelled, and a newer selection replaces the job
+    # still running for the previous one
+    def background_options(**options):
+        if not background:
+            return {}
+        return dict(
+            background=True,
+            interval=250,
+            running=[
+                (Output("render-status", "children"), "Rendering...", ""),
+                (Output("cancel-render", "disabled"), False, True),
             ],
-            style={"padding": "20px 0", "margin": "0 auto"},
+            cancel=[Input("cancel-render", "n_clicks")],
+            **options,
         )
-    ]
-)
 
+    # Normalize the dropdown values into the selection shared by every output
+    def normalize_selection(
+        selected_year, selected_university, selected_major, selected_course
+    ):
+        engine = partitions.get(selected_year).engine
+        selected_university = selected_university or []
+        if "all" in selected_university:
+            universities = ["all"]
+            last = engine.values("uni")[-1] if engine.n_rows else None
+        else:
+            universities = sorted(set(selected_university))
+            last = selected_university[-1] if selected_university else None
+        return {
+            "year": selected_year,
+            "uni": universities,
+            "major": selected_major,
+            "course": selected_course,
+            "last": last,
+        }
 
-# Define the additional output section with more charts and a data table
-additional_output = html.Div(
-    [
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div([dcc.Graph(id="major-pie-chart")]),
-                    width=4,  # Width of the first column
-                    style={
-                        "padding": "0 10px"
-                    },  # Add padding to prevent content from being too close to the edges
-                ),
-                dbc.Col(
-                    html.Div([dcc.Graph(id="university-line-chart")]),
-                    width=4,  # Width of the second column
-                    style={
-                        "padding": "0 10px"
-                    },  # Add padding to prevent content from being too close to the edges
-                ),
-                dbc.Col(
-                    html.Div(
-                        [
-                            dash_table.DataTable(
-                                id="data-table",
-                                columns=[
-                                    {"name": col, "id": col} for col in df.columns
-                                ],
-                                style_table={"overflowX": "auto"},
-                                style_cell={"textAlign": "left"},
-                                page_size=10,
-                            )
-                        ]
-                    ),
-                    width=4,  # Width of the third column
-                    style={
-                        "padding": "0 10px"
-                    },  # Add padding to prevent content from being too close to the edges
-                ),
-            ],
-            style={
-                "padding": "20px 0",
-                "color": "black",
-                "margin": "0 auto",
-            },  # Add padding to the row
+    # Cache key of a result for a normalized selection
+    def selection_key(name, selection, *extra):
+        return (
+            name,
+            partitions.get(selection["year"]).version,
+            tuple(selection["uni"]),
+            selection["major"],
+            selection["course"],
+        ) + extra
+
+    # Rows of a normalized selection and the partition they belong to
+    def selected_rows(selection):
+        partition = partitions.get(selection["year"])
+        rows = partition.engine.select(
+            selection["uni"], selection["major"], selection["course"]
         )
-    ]
-)
+        return partition, rows
 
-# Define the app layout to include the navbar, header, filters, and output sections
-app.layout = html.Div(
-    children=[
-        navbar,
-        header,
-        filter,
-        output,
-        additional_output,  # Add the new output section to the layout
-    ]
-)
+    # Callback to update the title for the selected year
+    @app.callback(
+        Output("dashboard-title", "children"),
+        Input("year-dropdown", "value"),
+        prevent_initial_call=True,
+    )
+    @instrumented("title")
+    def update_title(selected_year):
+        return f"Number Of Admitted Dashboard {selected_year}"
+
+    # Callback to narrow the options of the university and major dropdowns to
+    # the values that exist with the selection of the other two. Selected
+    # values stay in the options so they can still be seen and removed.
+    @app.callback(
+        [
+            Output("university-dropdown", "options"),
+            Output("major-dropdown", "options"),
+        ],
+        [
+            Input("year-dropdown", "value"),
+            Input("university-dropdown", "value"),
+            Input("major-dropdown", "value"),
+            Input("course-dropdown", "value"),
+        ],
+        prevent_initial_call=True,
+    )
+    @instrumented("options")
+    def update_options(
+        selected_year, selected_university, selected_major, selected_course
+    ):
+        selected_university = selected_university or ["all"]
+        with timed("options", "filter"):
+            narrowed = partitions.get(selected_year).options.narrow(
+                selected_university, selected_major, selected_course
+            )
+        selected = {"uni": selected_university, "major": [selected_major]}
+        options = []
+        for column in ["uni", "major"]:
+            values = narrowed[column]
+            kept = set(values)
+            values += [
+                v for v in selected[column] if v and v != "all" and v not in kept
+            ]
+            options.append(
+                [{"label": "Select All", "value": "all"}]
+                + [{"label": value, "value": value} for value in values]
+            )
+        return options
 
+    # Callback to update the course options: the first COURSE_OPTIONS_LIMIT
+    # courses that exist with the selected university and major or, while
+    # text is typed in the dropdown, the best matches of the search index
+    # among them. The selected course stays in the options.
+    @app.callback(
+        Output("course-dropdown", "options"),
+        [
+            Input("year-dropdown", "value"),
+            Input("university-dropdown", "value"),
+            Input("major-dropdown", "value"),
+            Input("course-dropdown", "value"),
+            Input("course-dropdown", "search_value"),
+        ],
+        prevent_initial_call=True,
+    )
+    @instrumented("course_options")
+    def update_course_options(
+        selected_year,
+        selected_university,
+        selected_major,
+        selected_course,
+        search_value,
+    ):
+        partition = partitions.get(selected_year)
+        with timed("course_options", "filter"):
+            courses = partition.options.narrow(
+                selected_university or ["all"], selected_major, selected_course
+            )["course"]
+        if search_value:
+            with timed("course_options", "search"):
+                available = set(courses)
+                index = partition.search
+                matches = (
+                    index.values[document]
+                    for document in index.search(search_value, "course")
+                )
+                courses = [course for course in matches if course in available]
+        courses = courses[:COURSE_OPTIONS_LIMIT]
+        if (
+            selected_course
+            and selected_course != "all"
+            and selected_course not in courses
+        ):
+            courses.append(selected_course)
+        return [{"label": "Select All", "value": "all"}] + [
+            {"label": course, "value": course} for course in courses
+        ]
+
+    # Callback to publish the normalized filter state. Outputs downstream of the
+    # store only run when the selection actually changes.
+    @app.callback(
+        Output("selection-store", "data"),
+        [
+            Input("year-dropdown", "value"),
+            Input("university-dropdown", "value"),
+            Input("major-dropdown", "value"),
+            Input("course-dropdown", "value"),
+        ],
+        State("selection-store", "data"),
+    )
+    @instrumented("selection")
+    def update_selection(
+        selected_year, selected_university, selected_major, selected_course, current
+    ):
+        selection = normalize_selection(
+            selected_year, selected_university, selected_major, selected_course
+        )
+        if selection == current:
+            return no_update
+        return selection
 
-# Callback to update the visualizations based on filter and sort inputs
-@callback(
-    [
+    # Averages and total of a selection in a year from its aggregate cube
+    def selection_totals(selection, year):
+        totals = partitions.cube(year).totals(
+            selection["uni"], selection["major"], selection["course"]
+        )
+        count = totals["count"] or float("nan")
+        return {
+            "success_rate": totals["success_rate"] / count,
+            "fee": totals["fee"] / count,
+            "total_admitted": int(totals["total_admitted"]),
+        }
+
+    # Callback to update the KPI cards
+    @app.callback(
+        [
+            Output("success-rate-value", "children"),
+            Output("fee-value", "children"),
+            Output("admitted-value", "children"),
+        ],
+        Input("selection-store", "data"),
+    )
+    @instrumented("kpis")
+    def update_kpis(selection):
+        with timed("kpis", "aggregate"):
+            totals = selection_totals(selection, selection["year"])
+        return totals["success_rate"], totals["fee"], totals["total_admitted"]
+
+    # Per-university summary of the selected programmes shown on the charts
+    # and the map
+    @result_cache.memoize(lambda selection: selection_key("map_summary", selection))
+    def university_summary(selection):
+        with timed("university_summary", "filter"):
+            partition, rows = selected_rows(selection)
+        with timed("university_summary", "aggregate"):
+            return partition.map_layer.summarize(rows)
+
+    # Callback to update the bar chart of the admitted total per university
+    @app.callback(
         Output("university-bar-chart", "figure"),
-        Output("map-graph", "figure"),
-        Output("success-rate-value", "children"),
-        Output("fee-value", "children"),
-        Output("admitted-value", "children"),
+        Input("selection-store", "data"),
+        **background_options(),
+    )
+    @instrumented("bar_chart")
+    @result_cache.memoize(lambda selection: selection_key("bar_chart", selection))
+    def update_bar_chart(selection):
+        summary = university_summary(selection)
+        with timed("bar_chart", "figure"):
+            return bar_figure(summary, selection["year"])
+
+    # Callback to update the success rate pie chart
+    @app.callback(
         Output("major-pie-chart", "figure"),
+        Input("selection-store", "data"),
+    )
+    @instrumented("pie_chart")
+    def update_pie_chart(selection):
+        with timed("pie_chart", "aggregate"):
+            totals = selection_totals(selection, selection["year"])
+        with timed("pie_chart", "figure"):
+            return pie_figure(totals["success_rate"], selection["year"])
+
+    # Callback to update the line chart of the admitted total of the selected
+    # programmes in every year. It only reads the aggregate cube of each year,
+    # but the first time that loads every year. In the background it reports
+    # the years done so far.
+    @app.callback(
         Output("university-line-chart", "figure"),
-        Output("data-table", "data"),
-    ],
-    [
-        Input("university-dropdown", "value"),
-        Input("major-dropdown", "value"),
-        Input("course-dropdown", "value"),
-        Input("marker-mode", "value"),
-    ],
-)
-def update_visualizations(selected_university, selected_major, selected_course, marker_mode):
-    # Handle "Select All" option for universitys
-    if "all" in selected_university:
-        selected_university = df["uni"].unique().tolist()
-
-    # Filter data based on selected universitys
-    filtered_df = df[df["uni"].isin(selected_university)]
-
-    # Handle "All" option for major
-    if selected_major == "all":
-        # Compute total counts for both majors
-        average_success_rate = filtered_df["success_rate"].sum() / len(
-            filtered_df["success_rate"]
-        )
-        average_fee = filtered_df["fee"].sum() / len(filtered_df["fee"])
-        filtered_df["total_admitted"] = filtered_df[
-            ["round1", "round2", "round3", "round4"]
-        ].sum(axis=1)
-        total_admitted = filtered_df["total_admitted"].sum()
-        y_values = "major"
-    else:
-        filtered_df = df[df["major"].isin([selected_major])]
-        average_success_rate = filtered_df["success_rate"].sum() / len(
-            filtered_df["success_rate"]
-        )
-        average_fee = filtered_df["fee"].sum() / len(filtered_df["fee"])
-        filtered_df["total_admitted"] = filtered_df[
-            ["round1", "round2", "round3", "round4"]
-        ].sum(axis=1)
-        total_admitted = filtered_df["total_admitted"].sum()
-        y_values = selected_major
-
-    if selected_course == "all":
-        # Compute total counts for both majors
-        average_success_rate = filtered_df["success_rate"].sum() / len(
-            filtered_df["success_rate"]
-        )
-        average_fee = filtered_df["fee"].sum() / len(filtered_df["fee"])
-        filtered_df["total_admitted"] = filtered_df[
-            ["round1", "round2", "round3", "round4"]
-        ].sum(axis=1)
-        total_admitted = filtered_df["total_admitted"].sum()
-        y_values = "course"
-    else:
-        filtered_df = df[df["course"].isin([selected_course])]
-        average_success_rate = filtered_df["success_rate"].sum() / len(
-            filtered_df["success_rate"]
+        Input("selection-store", "data"),
+        **background_options(
+            progress=[
+                Output("render-progress", "value"),
+                Output("render-progress", "max"),
+            ],
+            progress_default=[0, 100],
+        ),
+    )
+    @instrumented("line_chart")
+    def update_line_chart(*args):
+        set_progress, selection = args if background else (None, args[0])
+        totals = []
+        with timed("line_chart", "aggregate"):
+            for done, year in enumerate(years, 1):
+                totals.append(selection_totals(selection, year)["total_admitted"])
+                if set_progress is not None:
+                    set_progress((done, len(years)))
+        with timed("line_chart", "figure"):
+            return trend_figure(years, totals)
+
+    # Callback to update the province view of the selected year. The table
+    # is precomputed by data_preparation, so this only fills in the figures.
+    @app.callback(
+        [
+            Output("province-map", "figure"),
+            Output("province-bar-chart", "figure"),
+        ],
+        Input("year-dropdown", "value"),
+    )
+    @instrumented("provinces")
+    @result_cache.memoize(
+        lambda selected_year: ("provinces", partitions.get(selected_year).version)
+    )
+    def update_provinces(selected_year):
+        table = partitions.get(selected_year).provinces
+        if table is None:
+            empty = {"layout": {"template": TEMPLATE}}
+            return empty, empty
+        with timed("provinces", "figure"):
+            return (
+                province_map_figure(table),
+                province_bar_figure(table, selected_year),
+            )
+
+    # Row positions of the data table for a selection, filter and sort order
+    @result_cache.memoize(
+        lambda selection, sort_by, filter_query: selection_key(
+            "table",
+            selection,
+            tuple((sort["column_id"], sort["direction"]) for sort in sort_by or []),
+            filter_query or "",
         )
-        average_fee = filtered_df["fee"].sum() / len(filtered_df["fee"])
-        filtered_df["total_admitted"] = filtered_df[
-            ["round1", "round2", "round3", "round4"]
-        ].sum(axis=1)
-        total_admitted = filtered_df["total_admitted"].sum()
-        y_values = selected_course
-
-    sorted_df = filtered_df
-
-    # Create Bar Chart
-    bar_fig = px.bar(
-        sorted_df,
-        x="uni",
-        y=["total_admitted"] if selected_major == "all" else y_values,
-        title="Number of Admiited in 2566",
-        labels={
-            "uni": "University",
-            "value": "Number of Admiited",
-        },
-        barmode="relative",
     )
+    def table_rows(selection, sort_by, filter_query):
+        with timed("table_rows", "filter"):
+            partition, rows = selected_rows(selection)
+            rows = apply_filter_query(partition.df, rows, filter_query)
+        with timed("table_rows", "sort"):
+            return apply_sort_by(partition.sort_ranks, rows, sort_by)
 
-    # Create Pie Chart
-    success_data = {
-        "label": ["Success", "Fail"],
-        "value": [average_success_rate, 100 - average_success_rate],
-    }
-    success_rate = pd.DataFrame(success_data)
-    pie_fig = px.pie(
-        success_rate,
-        names="label",
-        values="value",
-        title="Success Rate Distribution of Graduates in 2566",
+    # Callback to update the data table with only the current page. Any change
+    # other than paging goes back to the first page.
+    @app.callback(
+        [
+            Output("data-table", "data"),
+            Output("data-table", "page_count"),
+            Output("data-table", "page_current"),
+        ],
+        [
+            Input("selection-store", "data"),
+            Input("data-table", "page_current"),
+            Input("data-table", "page_size"),
+            Input("data-table", "sort_by"),
+            Input("data-table", "filter_query"),
+        ],
     )
+    @instrumented("table")
+    def update_table(selection, page_current, page_size, sort_by, filter_query):
+        rows = table_rows(selection, sort_by, filter_query)
+        page_count = max(1, -(-len(rows) // page_size))
+        if "data-table.page_current" not in ctx.triggered_prop_ids:
+            page_current = 0
+        page_current = min(page_current or 0, page_count - 1)
+        partition = partitions.get(selection["year"])
+        with timed("table", "page"):
+            table_data = page_records(
+                partition.df, rows, partition.table_columns, page_current, page_size
+            )
+        return table_data, page_count, page_current
 
-    # Create Line Chart
-    line_fig = px.line(
-        filtered_df,
-        x="uni",
-        y=["total_admitted"],
-        title="Trend of Admiited in 2566",
-        labels={
-            "uni": "University",
-            "value": "Number of Admiited",
-        },
+    # Callback to send the map figure of a selection to the browser, along with
+    # the metric each marker mode colors the markers by
+    @app.callback(
+        Output("map-data", "data"),
+        Input("selection-store", "data"),
+        **background_options(),
+    )
+    @instrumented("map")
+    @result_cache.memoize(
+        lambda selection: selection_key("map", selection, selection["last"])
     )
+    def update_map_data(selection):
+        summary = university_summary(selection)
+        partition = partitions.get(selection["year"])
+        df = partition.df
+
+        # The last selected university may not exist in the selected year
+        row = None
+        if selection["last"] is not None:
+            row = partition.engine.first_row("uni", selection["last"])
 
-    # Create Data Table
-    table_data = filtered_df.to_dict("records")
-
-    if marker_mode == "admitted":
-        color_scale = px.colors.sequential.Sunsetdark
-        color_column = "total_admitted"
-    elif marker_mode == "fee":
-        color_scale = px.colors.sequential.RdBu
-        color_column = "fee"
-    elif marker_mode == "success_rate":
-        color_scale = px.colors.sequential.OrRd
-        color_column = "success_rate"
-
-    if not selected_university:
-        lat, lon, zoom = df['lat'].mean(), df['lon'].mean(), 5
-
-    else:
-        last_clicked_university = selected_university[-1]
-        lat = df[df["uni"] == last_clicked_university]["lat"].values[0]
-        lon = df[df["uni"] == last_clicked_university]["lon"].values[0]
-        zoom = 15
-
-    map_fig = px.scatter_mapbox(
-        filtered_df,
-        lat="lat",
-        lon="lon",
-        hover_name="uni",
-        color=color_column,
-        color_continuous_scale=color_scale,
-        size=color_column,
-        zoom=zoom,
-        height=450,
+        if row is None:
+            lat, lon, zoom = df['lat'].mean(), df['lon'].mean(), 5
+
+        else:
+            lat = df["lat"].iat[row]
+            lon = df["lon"].iat[row]
+            zoom = 15
+
+        with timed("map", "figure"):
+            return {
+                "figure": map_figure(summary, "admitted", lat, lon, zoom),
+                "metrics": {
+                    column: summary[column].to_numpy()
+                    for column, _ in MARKER_MODES.values()
+                },
+            }
+
+    # Recolor the map in the browser. Switching the marker mode only swaps the
+    # marker colors and the color scale, so it never reaches the server.
+    app.clientside_callback(
+        """
+        function(mapData, markerMode, markerModes) {
+            if (!mapData) {
+                return window.dash_clientside.no_update;
+            }
+            const mode = markerModes[markerMode];
+            const figure = mapData.figure;
+            const trace = Object.assign({}, figure.data[0]);
+            trace.marker = Object.assign({}, trace.marker, {
+                color: mapData.metrics[mode.column],
+            });
+            const layout = Object.assign({}, figure.layout, {
+                coloraxis: {
+                    colorbar: {title: {text: mode.column}},
+                    colorscale: mode.colorscale,
+                },
+            });
+            return {data: [trace], layout: layout};
+        }
+        """,
+        Output("map-graph", "figure"),
+        [
+            Input("map-data", "data"),
+            Input("marker-mode", "value"),
+        ],
+        State("marker-modes", "data"),
     )
-    map_fig.update_layout(mapbox=dict(center=dict(lat=lat, lon=lon)))
-
-    map_fig.update_traces(marker=dict(size=10, opacity=0.7), selector=dict(mode="markers"))
-    map_fig.update_layout(mapbox_style="open-street-map")
-    map_fig.update_layout(margin={"r":0,"t":0,"l":0,"b":0})
-
-    return (
-        bar_fig,
-        map_fig,
-        average_success_rate,
-        average_fee,
-        total_admitted,
-        pie_fig,
-        line_fig,
-        table_data,
+
+    # Callback to drill down into a university when its map marker is clicked
+    @app.callback(
+        Output("university-dropdown", "value"),
+        Input("map-graph", "clickData"),
+        prevent_initial_call=True,
     )
+    @instrumented("drill_down")
+    def drill_down(click_data):
+        if not click_data or not click_data.get("points"):
+            return no_update
+        return [click_data["points"][0]["customdata"][0]]
 
 
 # Run the app
 if __name__ == "__main__":
-    app.run(debug=True, port=8080)
+    create_app().run(debug=True, port=8080)
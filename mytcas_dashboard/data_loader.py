@@ -0,0 +1,221 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+# pyarrow is optional, without it the dashboard falls back to the CSV file
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Long Thai text columns that repeat across many rows
+TEXT_COLUMNS = ["uni", "major", "minor", "course"]
+# Integer columns produced by data_preparation.clean
+INT_COLUMNS = ["fee", "success_rate", "round1", "round2", "round3", "round4"]
+ROUND_COLUMNS = ["round1", "round2", "round3", "round4"]
+# One dataset per admission year (Buddhist era, as pp3year in data.json),
+# written by data_preparation --year as data/years/<year>.csv and .arrow
+PARTITION_DIR = "data/years"
+# Year of the original single dataset, data/data_mark_01.csv
+LEGACY_YEAR = "2566"
+
+
+# Shrink the dataset in place: dictionary-encode the text columns and
+# downcast the integer ones to the narrowest dtype that holds their values.
+# Coordinates stay float64, float32 would move the map markers.
+def compact(df):
+    for column in TEXT_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in INT_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+
+# Write a compact dataset as an uncompressed Arrow IPC file. The text columns
+# are categorical, so they are stored as dictionary-encoded arrays.
+def write_arrow(df, path):
+    df = df.copy()
+    for column in TEXT_COLUMNS:
+        if column in df.columns:
+            # clean() fills missing text with 0, store it as the text "0"
+            df[column] = df[column].astype(str)
+    table = pa.Table.from_pandas(compact(df), preserve_index=False)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# Narrowest signed integer type holding every value from low to high, as
+# compact() picks for a column
+def narrow_int_type(low, high):
+    for arrow_type, numpy_type in [
+        (pa.int8(), np.int8),
+        (pa.int16(), np.int16),
+        (pa.int32(), np.int32),
+    ]:
+        info = np.iinfo(numpy_type)
+        if info.min <= low and high <= info.max:
+            return arrow_type
+    return pa.int64()
+
+
+# Convert a prepared CSV file to an Arrow IPC file one record batch at a
+# time, so memory does not depend on the size of the file. A first pass
+# finds the range of the integer columns so they are written as narrow as
+# write_arrow writes them. A file holds a single dictionary per column, so
+# the text columns are stored as plain strings here and dictionary-encoded
+# by read_arrow.
+def write_arrow_from_csv(csv_path, path, block_size=1 << 20):
+    def open_reader(column_types, columns=None):
+        return pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=block_size),
+            # Scraped text may hold quoted line breaks
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types=column_types,
+                include_columns=columns,
+                strings_can_be_null=True,
+            ),
+        )
+
+    column_types = {column: pa.string() for column in TEXT_COLUMNS}
+    column_types.update({column: pa.int64() for column in INT_COLUMNS})
+    column_types.update({column: pa.float64() for column in ["lat", "lon"]})
+
+    ranges = {}
+    for batch in open_reader(column_types, INT_COLUMNS):
+        for column in INT_COLUMNS:
+            low, high = pc.min_max(batch.column(column)).values()
+            if low.is_valid:
+                old = ranges.get(column, (low.as_py(), high.as_py()))
+                ranges[column] = (
+                    min(old[0], low.as_py()),
+                    max(old[1], high.as_py()),
+                )
+    for column, (low, high) in ranges.items():
+        column_types[column] = narrow_int_type(low, high)
+
+    reader = open_reader(column_types)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+
+
+# Read an Arrow IPC file through a memory map. Numeric columns and dictionary
+# codes stay views of the mapped file (read-only), so worker processes
+# loading the same file share its page-cache pages instead of private copies.
+def read_arrow(path):
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    # Files written by write_arrow_from_csv hold plain strings
+    for i, field in enumerate(table.schema):
+        if field.name in TEXT_COLUMNS and pa.types.is_string(field.type):
+            encoded = pc.dictionary_encode(table.column(i).combine_chunks())
+            table = table.set_column(i, field.name, encoded)
+    return table.to_pandas(split_blocks=True)
+
+
+# Whether a file data_preparation derives from a dataset CSV (its Arrow copy
+# or a sidecar) exists and was written after the CSV, i.e. the CSV was not
+# rewritten or edited by hand since
+def is_current(path, csv_path):
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(csv_path) or (
+        os.path.getmtime(csv_path) <= os.path.getmtime(path)
+    )
+
+
+# CSV a dataset (CSV or Arrow) was prepared as
+def source_path(path):
+    return os.path.splitext(path)[0] + ".csv"
+
+
+# Prefer the Arrow file next to the CSV when it exists, is current and
+# pyarrow is installed
+def find_dataset(path="data/data_mark_01.csv"):
+    arrow_path = os.path.splitext(path)[0] + ".arrow"
+    if pa is not None and is_current(arrow_path, path):
+        return arrow_path
+    return path
+
+
+# Load the prepared dataset (Arrow or CSV) as a compact dataset with
+# total_admitted computed once
+def load_dataset(path="data/data_mark_01.csv"):
+    if path.endswith(".arrow"):
+        df = read_arrow(path)
+    else:
+        dtypes = {column: "category" for column in TEXT_COLUMNS}
+        df = pd.read_csv(path, dtype=dtypes)
+        df = compact(df)
+    df["total_admitted"] = pd.to_numeric(
+        df[ROUND_COLUMNS].sum(axis=1), downcast="integer"
+    )
+    return df
+
+
+# Version tag of a dataset file, changes whenever the file is rewritten
+def dataset_version(path="data/data_mark_01.csv"):
+    stat = os.stat(path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+# CSV path of the partition of one year
+def partition_path(year, directory=PARTITION_DIR):
+    return os.path.join(directory, f"{year}.csv")
+
+
+# Province table written by data_preparation next to a dataset (CSV or Arrow)
+def province_path(path):
+    return os.path.splitext(path)[0] + ".provinces.csv"
+
+
+# Per-province seats and students of a dataset (CSV or Arrow), None when it
+# was prepared without them or its table is stale
+def load_province_table(path):
+    table_path = province_path(path)
+    if not is_current(table_path, source_path(path)):
+        return None
+    return pd.read_csv(table_path)
+
+
+# Cells of the aggregate cube written by data_preparation next to a dataset
+def cube_path(path):
+    return os.path.splitext(path)[0] + ".cube.csv"
+
+
+# Aggregate cube cells of a dataset (CSV or Arrow), None when it was prepared
+# without them or they are stale
+def load_cube_cells(path):
+    cells_path = cube_path(path)
+    if not is_current(cells_path, source_path(path)):
+        return None
+    return pd.read_csv(cells_path, dtype={column: str for column in TEXT_COLUMNS})
+
+
+# Dataset path of every available year, {year: path}, preferring Arrow files
+# as find_dataset does. The single legacy dataset stands for LEGACY_YEAR when
+# that year has no partition of its own. Only the directory is listed, no
+# file is read.
+def find_partitions(directory=PARTITION_DIR, legacy_path="data/data_mark_01.csv"):
+    paths = {}
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory)):
+            match = re.fullmatch(r"(\d{4})\.(csv|arrow)", name)
+            if match is None:
+                continue
+            year, extension = match.groups()
+            if extension == "arrow" and pa is None:
+                continue
+            paths[year] = find_dataset(partition_path(year, directory))
+    if LEGACY_YEAR not in paths and os.path.exists(legacy_path):
+        paths[LEGACY_YEAR] = find_dataset(legacy_path)
+    return dict(sorted(paths.items()))
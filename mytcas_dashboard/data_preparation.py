@@ -1,16 +1,41 @@
+import argparse
+import glob
+import itertools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+import aggregate_cube
+import data_loader
+import metrics
+import provinces
+from metrics import pipeline_stage
+
+
+# Keywords of the faculty to keep, engineering by default
+DEFAULT_KEYWORDS = ["วิศวกรรม"]
+# Columns searched for the faculty keywords
+KEYWORD_COLUMNS = ["major", "minor", "course", "course_name"]
 
-# Filter rows where the 'major', 'minor', 'course', or 'course_name' columns contain the keyword 'วิศวกรรม'
-def filter(df):
-    major_df = df[df["major"].str.contains("วิศวกรรม", na=False)]
-    minor_df = df[df["minor"].str.contains("วิศวกรรม", na=False)]
-    course_df = df[df["course"].str.contains("วิศวกรรม", na=False)]
-    course_name_df = df[df["course_name"].str.contains("วิศวกรรม", na=False)]
 
-    # Combine the filtered DataFrames and remove duplicates
-    combine_df = pd.concat([major_df, minor_df, course_df, course_name_df])
-    combine_df = combine_df.drop_duplicates()
+# Compile the keywords into one alternation regex so every column is scanned
+# once regardless of how many keywords there are
+def keyword_pattern(keywords):
+    return "|".join(re.escape(keyword) for keyword in keywords)
+
+
+# Filter rows where the 'major', 'minor', 'course', or 'course_name' columns
+# contain any of the keywords (default 'วิศวกรรม'), keeping the source order
+@pipeline_stage("filter")
+def filter(df, keywords=DEFAULT_KEYWORDS):
+    pattern = keyword_pattern(keywords)
+    mask = pd.Series(False, index=df.index)
+    for column in KEYWORD_COLUMNS:
+        mask |= df[column].str.contains(pattern, na=False, regex=True)
+    combine_df = df[mask].copy()
 
     # Columns to delete from the combined DataFrame
     delete_columns = [
@@ -29,6 +54,7 @@ def filter(df):
 
 
 # Clean up specific columns by removing numerical prefixes and extracting numerical values
+@pipeline_stage("clean")
 def clean(convert_df):
     convert_df["major"] = convert_df["major"].str.replace(r"\d+\.\s*", "", regex=True)
     convert_df["minor"] = convert_df["minor"].str.replace(r"\d+\.\s*", "", regex=True)
@@ -57,6 +83,7 @@ def clean(convert_df):
     return convert_df
 
 
+@pipeline_stage("adjust_fee")
 def adjust_fee(combine_df, cleaned_df):
     # Adjust fees to a minimum value if they are less than 80,000
     # Extract the numerical part of the fee from combine_df
@@ -86,6 +113,69 @@ def adjust_fee(combine_df, cleaned_df):
     return cleaned_df
 
 
+# Raw fields parsed by parse_fields, joined per row in this order
+NUMERIC_COLUMNS = ["fee", "success_rate", "round1", "round2", "round3", "round4"]
+FIELD_SEPARATOR = "\x1f"
+
+# One regex over the joined fields. It applies the same per-field patterns as
+# clean() and the "ตลอดหลักสูตร" (whole programme) check of adjust_fee().
+FIELD_PATTERN = re.compile(
+    r"^(?=(?P<whole>[^\x1f]*ตลอดหลักสูตร)?)"
+    r"(?:[^\x1f]*?(?P<fee>\d[\d,]*))?[^\x1f]*\x1f"
+    r"(?:[^\x1f]*?(?P<success_rate>\b\d{1,3}\b))?[^\x1f]*\x1f"
+    r"(?:[^\x1f\d]*(?P<round1>\d+))?[^\x1f]*\x1f"
+    r"(?:[^\x1f\d]*(?P<round2>\d+))?[^\x1f]*\x1f"
+    r"(?:[^\x1f\d]*(?P<round3>\d+))?[^\x1f]*\x1f"
+    r"(?:[^\x1f\d]*(?P<round4>\d+))?[^\x1f]*$"
+)
+
+
+# Remove numerical prefixes ("1. ") from a text column. Faculty and field
+# names repeat across many rows, so the regex runs once per distinct value.
+def strip_numbering(series):
+    codes, uniques = pd.factorize(series)
+    cleaned = pd.Series(uniques, dtype=object).str.replace(
+        r"\d+\.\s*", "", regex=True
+    )
+    # Missing values (code -1) stay missing, even when every value is missing
+    values = cleaned.reindex(codes).to_numpy()
+    return pd.Series(values, index=series.index, dtype=object)
+
+
+# Fused replacement for clean() + adjust_fee(): extract every numeric field
+# and the fee unit from the raw row in a single regex pass, then normalize
+# per-semester fees to the whole programme. Only needs convert_df, so it
+# does not depend on combine_df and convert_df sharing an index.
+@pipeline_stage("parse_fields")
+def parse_fields(convert_df):
+    for column in ["major", "minor", "course"]:
+        convert_df[column] = strip_numbering(convert_df[column])
+
+    joined = convert_df[NUMERIC_COLUMNS[0]].str.cat(
+        [convert_df[column] for column in NUMERIC_COLUMNS[1:]],
+        sep=FIELD_SEPARATOR,
+        na_rep="",
+    )
+    fields = joined.str.extract(FIELD_PATTERN)
+    fields["fee"] = fields["fee"].str.replace(",", "")
+    whole = fields["whole"].notna().to_numpy()
+    for column in NUMERIC_COLUMNS:
+        convert_df[column] = pd.to_numeric(fields[column]).fillna(0).astype(int)
+    # Text columns stay object even when all of their values were missing
+    with pd.option_context("future.no_silent_downcasting", True):
+        convert_df = convert_df.fillna(0)
+
+    # Per-semester fees: whole-programme fees under 75,000 or per-term fees
+    # under 200,000 are multiplied by 8 semesters
+    fee = convert_df["fee"].to_numpy()
+    per_semester = (whole & (fee < 75000)) | (~whole & (fee < 200000))
+    convert_df["fee"] = fee * np.where(per_semester, 8, 1)
+
+    print("Parse success!")
+    return convert_df
+
+
+@pipeline_stage("merge_latlong")
 def merge_latlong(cleaned_df):
     # Create a DataFrame with university names and their corresponding latitude and longitude values
     data = {
@@ -262,27 +352,368 @@ def merge_latlong(cleaned_df):
     # Create a DataFrame from the university latitude and longitude data
     df_lat_lon = pd.DataFrame(data)
 
-    # Merge the cleaned DataFrame with the latitude and longitude DataFrame
-    df_merged = pd.merge(cleaned_df, df_lat_lon, on="uni", how="left")
+    # Merge the cleaned DataFrame with the latitude and longitude DataFrame,
+    # keeping the index of cleaned_df so rows can be traced back to the export
+    df_merged = cleaned_df.join(df_lat_lon.set_index("uni"), on="uni")
 
     print("merge success!")
     return df_merged
 
 
 # Save the merged DataFrame to a new CSV file
-def save_as_csv(df_merged):
+@pipeline_stage("save_as_csv")
+def save_as_csv(df_merged, path="data/data_mark_01.csv"):
     try:
-        df_merged.to_csv("data/data_mark_01.csv", index=False)
+        df_merged.to_csv(path, index=False)
         print("Save success!")
     except Exception as e:
         print(f"Save failed: {e}")
 
 
+# Path of the Arrow file written next to a CSV output
+def arrow_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".arrow"
+
+
+# Also save the merged DataFrame as a typed Arrow IPC file next to the CSV,
+# which the dashboard memory-maps instead of parsing the CSV
+@pipeline_stage("save_as_arrow")
+def save_as_arrow(df_merged, path="data/data_mark_01.arrow"):
+    if data_loader.pa is None:
+        print("Skip Arrow output: pyarrow is not installed")
+        return
+    try:
+        data_loader.write_arrow(df_merged, path)
+        print("Save Arrow success!")
+    except Exception as e:
+        print(f"Save Arrow failed: {e}")
+
+
+# Convert a saved CSV output to the Arrow file next to it without loading
+# the whole output, for the streaming mode
+def save_csv_as_arrow(csv_path, path="data/data_mark_01.arrow"):
+    if data_loader.pa is None:
+        print("Skip Arrow output: pyarrow is not installed")
+        return
+    try:
+        data_loader.write_arrow_from_csv(csv_path, path)
+        print("Save Arrow success!")
+    except Exception as e:
+        print(f"Save Arrow failed: {e}")
+
+
+# Run every stage on one DataFrame of scraped rows
+def process(df, keywords=DEFAULT_KEYWORDS):
+    convert_df, combine_df = filter(df, keywords)
+    del combine_df
+    cleaned_df = parse_fields(convert_df)
+    return merge_latlong(cleaned_df)
+
+
+# Stream the scraper export through the same stages in bounded-size chunks and
+# append each processed chunk to the output, so peak memory depends on the
+# chunk size rather than the size of the export. Every column is read as text
+# so a chunk where a column happens to be empty keeps the same dtypes.
+def run_streaming(
+    input_path="data/tcas.csv",
+    output_path="data/data_mark_01.csv",
+    chunksize=10000,
+    keywords=DEFAULT_KEYWORDS,
+):
+    try:
+        rows_out = 0
+        chunks = pd.read_csv(input_path, chunksize=chunksize, dtype=str)
+        for number, chunk in enumerate(chunks):
+            df_merged = process(chunk, keywords)
+            df_merged.to_csv(
+                output_path,
+                mode="w" if number == 0 else "a",
+                header=number == 0,
+                index=False,
+            )
+            rows_out += len(df_merged)
+        print(f"Save success! ({rows_out} rows)")
+        # Only one chunk is kept in memory, so convert the output once it is
+        # complete, one block at a time
+        save_csv_as_arrow(output_path, arrow_path(output_path))
+    except Exception as e:
+        print(f"Save failed: {e}")
+
+
+# Run the stages on one shard in a worker process. The worker returns the
+# stage metrics of this shard along with its output.
+def process_shard(path, keywords=DEFAULT_KEYWORDS):
+    metrics.PIPELINE = metrics.Metrics()
+    df_merged = process(pd.read_csv(path, dtype=str), keywords)
+    return df_merged, metrics.PIPELINE
+
+
+# Run the stages on a directory of shard exports (the scraper writes one CSV
+# per university) in a pool of worker processes, one shard per task. Shards
+# are taken in file name order and their outputs concatenated in that order,
+# so the output is the same as a serial run over the shards concatenated in
+# that order. Every column is read as text, as in run_streaming, so a shard
+# where a column happens to be empty keeps the same dtypes.
+def run_sharded(
+    shard_dir,
+    output_path="data/data_mark_01.csv",
+    workers=None,
+    keywords=DEFAULT_KEYWORDS,
+):
+    try:
+        paths = sorted(glob.glob(os.path.join(shard_dir, "*.csv")))
+        if not paths:
+            raise FileNotFoundError(f"no CSV shards in {shard_dir}")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(process_shard, paths, itertools.repeat(keywords))
+            )
+        for path, (_, shard_metrics) in zip(paths, results):
+            metrics.PIPELINE.merge(shard_metrics, shard=os.path.basename(path))
+        df_merged = pd.concat([df for df, _ in results], ignore_index=True)
+        print(f"Merged {len(paths)} shards ({len(df_merged)} rows)")
+        save_as_csv(df_merged, output_path)
+        save_as_arrow(df_merged, arrow_path(output_path))
+        return df_merged
+    except Exception as e:
+        print(f"Save failed: {e}")
+
+
+# University totals and aggregate cube cells of a prepared CSV file, read a
+# chunk at a time and only the columns they need
+def read_output_totals(path, chunksize=10000):
+    chunks = pd.read_csv(
+        path,
+        usecols=aggregate_cube.DIMENSIONS
+        + ["lat", "lon", "fee", "success_rate"]
+        + data_loader.ROUND_COLUMNS,
+        dtype={column: str for column in aggregate_cube.DIMENSIONS},
+        chunksize=chunksize,
+    )
+    universities = []
+    cells = []
+    for chunk in chunks:
+        universities.append(provinces.university_totals(chunk))
+        cells.append(aggregate_cube.cube_cells(chunk))
+    return (
+        provinces.combine_university_totals(universities),
+        aggregate_cube.combine_cube_cells(cells),
+    )
+
+
+# Save the row count and measure sums per (major, course, uni) of the
+# prepared dataset, from which the dashboard builds the aggregate cube of a
+# year without loading the dataset
+@pipeline_stage("cube_cells")
+def save_cube_cells(cells, path):
+    try:
+        cells.to_csv(path, index=False)
+        print("Save cube cells success!")
+    except Exception as e:
+        print(f"Save cube cells failed: {e}")
+
+
+# Save the admission seats per province of the prepared dataset (its
+# university totals) against the Mathayom 6 students of its year, for the
+# dashboard's province view. Every join and ratio is computed here, once per
+# build.
+@pipeline_stage("province_table")
+def save_province_table(
+    universities,
+    path,
+    year=data_loader.LEGACY_YEAR,
+    students_path="data/data.json",
+    coords_path="data/province.py",
+):
+    try:
+        table = provinces.build_province_table(
+            universities,
+            provinces.load_province_coords(coords_path),
+            provinces.load_students(students_path, year),
+        )
+        table.to_csv(path, index=False)
+        print("Save province table success!")
+    except Exception as e:
+        print(f"Save province table failed: {e}")
+
+
+# Column identifying a scraped programme, and the columns the pipeline reads
+ID_COLUMN = "course-href"
+CONTENT_COLUMNS = ["uni"] + KEYWORD_COLUMNS + NUMERIC_COLUMNS
+
+
+# Stable identity of every scraped row: its course-href plus an occurrence
+# number in case the same programme is listed more than once
+def row_ids(df):
+    occurrence = df.groupby(ID_COLUMN, dropna=False).cumcount().astype(str)
+    return df[ID_COLUMN].fillna("") + "#" + occurrence
+
+
+# Content hash of every scraped row over the columns the pipeline reads, so
+# scraper bookkeeping (order, start url, hrefs) does not mark a row changed
+def row_hashes(df):
+    return pd.util.hash_pandas_object(df[CONTENT_COLUMNS], index=False)
+
+
+# Re-run only new or changed rows. The state file (a pickled DataFrame) keeps
+# the id, content hash and processed output (empty when the row was filtered
+# out) of every row of the previous run; unchanged rows are copied from it.
+# Deleting the state file or changing the keywords forces a full run.
+def run_incremental(
+    input_path="data/tcas.csv",
+    output_path="data/data_mark_01.csv",
+    state_path="data/prepare_state.pkl",
+    keywords=DEFAULT_KEYWORDS,
+):
+    try:
+        df = pd.read_csv(input_path, dtype=str)
+        df.index = row_ids(df)
+        hashes = row_hashes(df)
+        pattern = keyword_pattern(keywords)
+
+        previous = None
+        if os.path.exists(state_path):
+            previous = pd.read_pickle(state_path)
+            if previous.attrs.get("pattern") != pattern:
+                previous = None
+
+        if previous is None:
+            changed = df.index
+        else:
+            known = df.index.isin(previous.index)
+            previous_hashes = previous["row_hash"].reindex(df.index, fill_value=0)
+            changed = df.index[~known | (previous_hashes != hashes).to_numpy()]
+        print(f"Incremental: {len(changed)} of {len(df)} rows new or changed")
+
+        df_merged = process(df.loc[changed], keywords)
+        if previous is not None:
+            unchanged = df.index.difference(changed, sort=False)
+            kept = previous.loc[unchanged]
+            kept = kept[kept["kept"]].drop(columns=["row_hash", "kept"])
+            kept = kept.astype({column: int for column in NUMERIC_COLUMNS})
+            df_merged = pd.concat([df_merged, kept])
+
+        # Rows keep the order of the export, as in a full run
+        df_merged = df_merged.reindex(df.index[df.index.isin(df_merged.index)])
+        save_as_csv(df_merged, output_path)
+        save_as_arrow(df_merged, arrow_path(output_path))
+
+        state = df_merged.reindex(df.index)
+        state.insert(0, "kept", df.index.isin(df_merged.index))
+        state.insert(0, "row_hash", hashes)
+        state.attrs["pattern"] = pattern
+        state.to_pickle(state_path)
+        return df_merged
+    except Exception as e:
+        print(f"Save failed: {e}")
+
+
 if __name__ == "__main__":
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv("data/tcas.csv")
-    convert_df, combine_df = filter(df)
-    cleaned_df = clean(convert_df)
-    cleaned_df = adjust_fee(combine_df, cleaned_df)
-    df_merged = merge_latlong(cleaned_df)
-    save_as_csv(df_merged)
+    parser = argparse.ArgumentParser(description="Prepare the MyTCAS dataset")
+    parser.add_argument("--input", default="data/tcas.csv")
+    parser.add_argument(
+        "--shards",
+        metavar="DIR",
+        help="process every CSV export in DIR in parallel instead of --input",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="worker processes for --shards (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--output",
+        help="output CSV (default: data/data_mark_01.csv, or the partition of --year)",
+    )
+    parser.add_argument(
+        "--year",
+        help="admission year of the export, written to data/years/<year>.csv",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="stream the input in chunks of this many rows",
+    )
+    parser.add_argument(
+        "--keyword",
+        action="append",
+        dest="keywords",
+        help="faculty keyword to keep, may be repeated (default: วิศวกรรม)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process rows that are new or changed since the last run",
+    )
+    parser.add_argument("--state", help="default: data/prepare_state.pkl")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="only rewrite the Arrow copy, province table and cube cells of"
+        " the existing --output (they are not committed)",
+    )
+    parser.add_argument(
+        "--students",
+        default="data/data.json",
+        help="Mathayom 6 students per province and year",
+    )
+    parser.add_argument("--province-coords", default="data/province.py")
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="write a cProfile and a tracemalloc snapshot of every stage to DIR",
+    )
+    args = parser.parse_args()
+    keywords = args.keywords or DEFAULT_KEYWORDS
+
+    # Each year is a partition with its own output and incremental state
+    if args.year:
+        args.output = args.output or data_loader.partition_path(args.year)
+        args.state = args.state or os.path.splitext(args.output)[0] + ".state.pkl"
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    args.output = args.output or "data/data_mark_01.csv"
+    args.state = args.state or "data/prepare_state.pkl"
+    if args.profile:
+        metrics.pipeline_profiler = metrics.Profiler(args.profile)
+
+    universities = cells = None
+    if args.shards:
+        df_merged = run_sharded(args.shards, args.output, args.workers, keywords)
+    elif args.incremental:
+        df_merged = run_incremental(args.input, args.output, args.state, keywords)
+    elif args.chunksize or args.rebuild:
+        if args.rebuild:
+            save_csv_as_arrow(args.output, arrow_path(args.output))
+        else:
+            run_streaming(args.input, args.output, args.chunksize, keywords)
+        # The output is not in memory, its totals are added up chunk by chunk
+        df_merged = None
+        if os.path.exists(args.output):
+            universities, cells = read_output_totals(
+                args.output, args.chunksize or 10000
+            )
+    else:
+        # Read the CSV file into a DataFrame
+        df = pd.read_csv(args.input)
+        df_merged = process(df, keywords)
+        save_as_csv(df_merged, args.output)
+        save_as_arrow(df_merged, arrow_path(args.output))
+
+    # Province table and aggregate cube cells of the output
+    if df_merged is not None:
+        universities = provinces.university_totals(df_merged)
+        cells = aggregate_cube.cube_cells(df_merged)
+    if cells is not None:
+        save_cube_cells(cells, data_loader.cube_path(args.output))
+    if universities is not None:
+        save_province_table(
+            universities,
+            data_loader.province_path(args.output),
+            args.year or data_loader.LEGACY_YEAR,
+            args.students,
+            args.province_coords,
+        )
+
+    # Stage timings, rows and peak memory, which the dashboard's /metrics
+    # route reports along with its own
+    metrics.PIPELINE.save(metrics.metrics_path(args.output))
@@ -0,0 +1,265 @@
+import numpy as np
+import plotly.io as pio
+from plotly.colors import make_colorscale, sequential
+
+# Figure builders for the dashboard callbacks. Layouts are built once at
+# import time and each request only fills in NumPy arrays of pre-aggregated
+# data, which skips the DataFrame validation and reshaping of plotly.express.
+# Figures are plain dicts, which Dash serializes as-is.
+
+# Default plotly template, converted to a dict once
+TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+TRACE_COLOR = TEMPLATE["layout"]["colorway"][0]
+
+# Color column and scale used by the map for each marker mode. The scales
+# are converted to [position, color] pairs here, which px normally does.
+MARKER_MODES = {
+    "admitted": ("total_admitted", make_colorscale(sequential.Sunsetdark)),
+    "fee": ("fee", make_colorscale(sequential.RdBu)),
+    "success_rate": ("success_rate", make_colorscale(sequential.OrRd)),
+}
+
+UNIVERSITY_AXES = {
+    "xaxis": {"anchor": "y", "domain": [0.0, 1.0], "title": {"text": "University"}},
+    "yaxis": {
+        "anchor": "x",
+        "domain": [0.0, 1.0],
+        "title": {"text": "Number of Admiited"},
+    },
+    "legend": {"title": {"text": "variable"}, "tracegroupgap": 0},
+}
+UNIVERSITY_HOVER = (
+    "variable=total_admitted<br>University=%{x}<br>"
+    "Number of Admiited=%{y}<extra></extra>"
+)
+
+BAR_LAYOUT = {
+    "template": TEMPLATE,
+    **UNIVERSITY_AXES,
+    "barmode": "relative",
+}
+TREND_LAYOUT = {
+    "template": TEMPLATE,
+    "xaxis": {
+        "anchor": "y",
+        "domain": [0.0, 1.0],
+        "title": {"text": "Year"},
+        "type": "category",
+    },
+    "yaxis": UNIVERSITY_AXES["yaxis"],
+    "legend": UNIVERSITY_AXES["legend"],
+    "title": {"text": "Trend of Admiited"},
+}
+TREND_HOVER = (
+    "variable=total_admitted<br>Year=%{x}<br>"
+    "Number of Admiited=%{y}<extra></extra>"
+)
+PIE_LAYOUT = {
+    "template": TEMPLATE,
+    "legend": {"tracegroupgap": 0},
+}
+MAP_HOVER = (
+    "<b>%{customdata[0]}</b><br><br>"
+    "Programmes=%{customdata[1]}<br>"
+    "Admitted=%{customdata[2]}<br>"
+    "Mean fee=%{customdata[3]:,.0f}<br>"
+    "Mean success rate=%{customdata[4]:.1f}<extra></extra>"
+)
+# Largest marker diameter in pixels, as size_max in px.scatter_mapbox
+MAP_SIZE_MAX = 25
+
+PROVINCE_MAP_HOVER = (
+    "<b>%{customdata[0]}</b><br><br>"
+    "Mathayom 6 students=%{customdata[1]:,}<br>"
+    "Admission seats=%{customdata[2]:,}<br>"
+    "Seats per 100 students=%{customdata[3]:.1f}<br>"
+    "Universities=%{customdata[4]}<extra></extra>"
+)
+PROVINCE_COLOR_SCALE = make_colorscale(sequential.Viridis)
+PROVINCE_BAR_LAYOUT = {
+    "template": TEMPLATE,
+    "xaxis": {"anchor": "y", "domain": [0.0, 1.0], "title": {"text": "Province"}},
+    "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "title": {"text": "Number"}},
+    "legend": {"tracegroupgap": 0},
+    "barmode": "group",
+}
+
+
+# Bar chart of the admitted total per university in one year
+def bar_figure(summary, year):
+    trace = {
+        "type": "bar",
+        "x": summary["uni"].to_numpy(dtype=object),
+        "y": summary["total_admitted"].to_numpy(),
+        "name": "total_admitted",
+        "legendgroup": "total_admitted",
+        "marker": {"color": TRACE_COLOR, "pattern": {"shape": ""}},
+        "orientation": "v",
+        "showlegend": True,
+        "textposition": "auto",
+        "hovertemplate": UNIVERSITY_HOVER,
+    }
+    layout = {**BAR_LAYOUT, "title": {"text": f"Number of Admiited in {year}"}}
+    return {"data": [trace], "layout": layout}
+
+
+# Line chart of the admitted total in every year
+def trend_figure(years, totals):
+    trace = {
+        "type": "scatter",
+        "mode": "lines+markers",
+        "x": list(years),
+        "y": list(totals),
+        "name": "total_admitted",
+        "legendgroup": "total_admitted",
+        "line": {"color": TRACE_COLOR, "dash": "solid"},
+        "marker": {"symbol": "circle"},
+        "orientation": "v",
+        "showlegend": True,
+        "hovertemplate": TREND_HOVER,
+    }
+    return {"data": [trace], "layout": TREND_LAYOUT}
+
+
+# Pie chart of the average success rate against the rest in one year
+def pie_figure(average_success_rate, year):
+    trace = {
+        "type": "pie",
+        "labels": ["Success", "Fail"],
+        "values": [average_success_rate, 100 - average_success_rate],
+        "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+        "showlegend": True,
+        "hovertemplate": "label=%{label}<br>value=%{value}<extra></extra>",
+    }
+    title = f"Success Rate Distribution of Graduates in {year}"
+    return {"data": [trace], "layout": {**PIE_LAYOUT, "title": {"text": title}}}
+
+
+# Map with one marker per university, sized by its number of programmes and
+# colored by the metric of the marker mode
+def map_figure(summary, marker_mode, lat, lon, zoom):
+    color_column, color_scale = MARKER_MODES[marker_mode]
+    programmes = summary["programmes"].to_numpy()
+    largest = programmes.max() if len(programmes) else 1
+    trace = {
+        "type": "scattermapbox",
+        "mode": "markers",
+        "lat": summary["lat"].to_numpy(dtype=np.float64),
+        "lon": summary["lon"].to_numpy(dtype=np.float64),
+        "hovertext": summary["uni"].to_numpy(dtype=object),
+        "customdata": np.column_stack(
+            [
+                summary["uni"].to_numpy(dtype=object),
+                programmes,
+                summary["total_admitted"].to_numpy(),
+                summary["fee"].to_numpy(),
+                summary["success_rate"].to_numpy(),
+            ]
+        ),
+        "marker": {
+            "color": summary[color_column].to_numpy(),
+            "coloraxis": "coloraxis",
+            "size": programmes,
+            "sizemode": "area",
+            "sizeref": 2.0 * largest / MAP_SIZE_MAX**2,
+            "sizemin": 6,
+            "opacity": 0.7,
+        },
+        "showlegend": False,
+        "subplot": "mapbox",
+        "hovertemplate": MAP_HOVER,
+    }
+    layout = {
+        "template": TEMPLATE,
+        "mapbox": {
+            "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+            "center": {"lat": float(lat), "lon": float(lon)},
+            "zoom": zoom,
+            "style": "open-street-map",
+        },
+        "coloraxis": {
+            "colorbar": {"title": {"text": color_column}},
+            "colorscale": color_scale,
+        },
+        "legend": {"itemsizing": "constant", "tracegroupgap": 0},
+        "height": 450,
+        "margin": {"r": 0, "t": 0, "l": 0, "b": 0},
+    }
+    return {"data": [trace], "layout": layout}
+
+
+# Map with one marker per province, sized by its Mathayom 6 students and
+# colored by the admission seats per 100 of them
+def province_map_figure(table):
+    students = table["totalstd"].to_numpy()
+    largest = students.max() if len(students) else 1
+    ratio = table["seats_per_100_students"].to_numpy(dtype=np.float64)
+    trace = {
+        "type": "scattermapbox",
+        "mode": "markers",
+        "lat": table["lat"].to_numpy(dtype=np.float64),
+        "lon": table["lon"].to_numpy(dtype=np.float64),
+        "hovertext": table["province"].to_numpy(dtype=object),
+        "customdata": np.column_stack(
+            [
+                table["province"].to_numpy(dtype=object),
+                students,
+                table["seats"].to_numpy(),
+                ratio,
+                table["universities"].to_numpy(),
+            ]
+        ),
+        "marker": {
+            # Clip the few provinces with many universities so the scale
+            # still tells the others apart
+            "color": np.minimum(ratio, np.nanpercentile(ratio, 95)),
+            "coloraxis": "coloraxis",
+            "size": students,
+            "sizemode": "area",
+            "sizeref": 2.0 * largest / MAP_SIZE_MAX**2,
+            "sizemin": 4,
+            "opacity": 0.7,
+        },
+        "showlegend": False,
+        "subplot": "mapbox",
+        "hovertemplate": PROVINCE_MAP_HOVER,
+    }
+    layout = {
+        "template": TEMPLATE,
+        "mapbox": {
+            "domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]},
+            "center": {"lat": 13.0, "lon": 101.0},
+            "zoom": 4.5,
+            "style": "open-street-map",
+        },
+        "coloraxis": {
+            "colorbar": {"title": {"text": "seats per 100"}},
+            "colorscale": PROVINCE_COLOR_SCALE,
+        },
+        "height": 450,
+        "margin": {"r": 0, "t": 0, "l": 0, "b": 0},
+    }
+    return {"data": [trace], "layout": layout}
+
+
+# Bar chart of the admission seats against the Mathayom 6 students of the
+# provinces with seats, most seats first
+def province_bar_figure(table, year):
+    table = table[table["seats"] > 0].sort_values("seats", ascending=False)
+    provinces = table["province"].to_numpy(dtype=object)
+    traces = [
+        {
+            "type": "bar",
+            "x": provinces,
+            "y": table[column].to_numpy(),
+            "name": name,
+            "hovertemplate": f"Province=%{{x}}<br>{name}=%{{y:,}}<extra></extra>",
+        }
+        for column, name in [
+            ("seats", "Admission seats"),
+            ("totalstd", "Mathayom 6 students"),
+        ]
+    ]
+    title = f"Admission Seats and Graduating Students by Province in {year}"
+    layout = {**PROVINCE_BAR_LAYOUT, "title": {"text": title}}
+    return {"data": traces, "layout": layout}
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+# Build an inverted index that maps every distinct value of a column to the
+# sorted row positions holding that value
+def build_index(series):
+    codes, uniques = pd.factorize(series, sort=False)
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    # Rows with a missing value (code -1) sort first, skip them
+    start = len(codes) - counts.sum()
+    index = {}
+    for value, count in zip(uniques, counts):
+        index[value] = order[start : start + count]
+        start += count
+    return index
+
+
+# Filter engine built once when the data loads. A dropdown selection becomes a
+# union/intersection of precomputed position arrays instead of a string scan
+# over the whole DataFrame.
+class FilterEngine:
+    def __init__(self, df, columns=("uni", "major", "course")):
+        self.n_rows = len(df)
+        self.all_rows = np.arange(self.n_rows)
+        self.index = {column: build_index(df[column]) for column in columns}
+
+    # Distinct values of a column in order of first appearance
+    def values(self, column):
+        return list(self.index[column])
+
+    # Row positions matching any of the given values (sorted, unique)
+    def rows_for(self, column, values):
+        index = self.index[column]
+        parts = [index[value] for value in values if value in index]
+        if not parts:
+            return np.empty(0, dtype=self.all_rows.dtype)
+        if len(parts) == 1:
+            return parts[0]
+        return np.unique(np.concatenate(parts))
+
+    # Row positions of the first row holding the given value, or None
+    def first_row(self, column, value):
+        rows = self.index[column].get(value)
+        if rows is None or len(rows) == 0:
+            return None
+        return rows[0]
+
+    # Resolve the dashboard filters ("all" means no filter) to row positions
+    def select(self, selected_university, selected_major, selected_course):
+        rows = self.all_rows
+        if "all" not in selected_university:
+            rows = self.rows_for("uni", selected_university)
+        if selected_major != "all":
+            rows = np.intersect1d(
+                rows, self.rows_for("major", [selected_major]), assume_unique=True
+            )
+        if selected_course != "all":
+            rows = np.intersect1d(
+                rows, self.rows_for("course", [selected_course]), assume_unique=True
+            )
+        return rows
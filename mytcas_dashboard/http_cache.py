@@ -0,0 +1,165 @@
+import gzip
+import hashlib
+
+import flask
+
+from result_cache import ResultCache
+
+# brotli is optional, without it responses are only gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images and fonts already are
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+CALLBACK_PATH = "/_dash-update-component"
+
+
+# Encodings the client accepts, in order of preference
+def accepted_encoding(request):
+    encodings = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+# Compression and conditional responses on the Flask server of the app.
+#
+# Callback responses are keyed by the request body (the callback, its inputs
+# and state) and the version of every dataset: the ETag is a hash of both, so
+# it changes whenever a dataset is rewritten. The final responses of recent
+# keys are kept, with their compressed variants, so a repeated filter state
+# gets a 304 when the client sends the ETag back, and the cached body
+# otherwise, without running the callback or serializing and compressing
+# its result again. Background jobs (the requests that start or poll them)
+# are never cached; their results are cached by the background manager.
+#
+# Other responses (the page, the layout, the component bundles) are
+# compressed, each variant once per ETag, and answered with a 304 when their
+# ETag matches. Bodies under min_size bytes are sent as-is. ETags are weak
+# since the bytes sent depend on the encoding.
+class HttpCache:
+    def __init__(self, versions, maxsize=256, ttl=None, min_size=500):
+        self.versions = versions
+        self.min_size = min_size
+        self.responses = ResultCache(maxsize=maxsize, ttl=ttl)
+        self.compressed = ResultCache(maxsize=64)
+
+    # ETag of a callback request, None when it must not be cached
+    def callback_etag(self, request):
+        if request.method != "POST" or request.path != CALLBACK_PATH:
+            return None
+        if request.args:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        for version in self.versions():
+            digest.update(version.encode())
+            digest.update(b"\0")
+        digest.update(request.get_data())
+        return digest.hexdigest()
+
+    def before_request(self):
+        request = flask.request
+        etag = self.callback_etag(request)
+        flask.g.http_etag = etag
+        if etag is None:
+            return None
+        found, entry = self.responses.lookup(etag)
+        if not found:
+            return None
+        flask.g.http_cached = True
+        if request.if_none_match.contains_weak(etag):
+            return self.not_modified(etag)
+        return self.cached_response(etag, entry, accepted_encoding(request))
+
+    def not_modified(self, etag):
+        response = flask.Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def cached_response(self, etag, entry, encoding):
+        body = entry["body"]
+        if encoding is not None and len(body) >= self.min_size:
+            if encoding not in entry:
+                entry[encoding] = compress(body, encoding)
+            body = entry[encoding]
+        else:
+            encoding = None
+        response = flask.Response(body, mimetype=entry["mimetype"])
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+        response.vary.add("Accept-Encoding")
+        return response
+
+    def after_request(self, response):
+        if flask.g.get("http_cached"):
+            return response
+        request = flask.request
+        etag = flask.g.get("http_etag")
+        if etag is not None:
+            # Only final callback results, not the job of a background callback
+            # or a prevented update
+            body = response.get_data()
+            if response.status_code != 200 or not body.startswith(b'{"multi"'):
+                return response
+            entry = {"body": body, "mimetype": response.mimetype}
+            self.responses.store(etag, entry)
+            if request.if_none_match.contains_weak(etag):
+                return self.not_modified(etag)
+            return self.cached_response(etag, entry, accepted_encoding(request))
+
+        # Requests starting or polling a background job: compressed only
+        if request.path == CALLBACK_PATH:
+            if response.status_code == 200:
+                self.compress_response(response, accepted_encoding(request))
+            return response
+
+        if (
+            request.method != "GET"
+            or response.status_code != 200
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or not response.mimetype.startswith(COMPRESSIBLE_TYPES)
+        ):
+            return response
+        tag = response.get_etag()[0]
+        if not tag:
+            response.add_etag()
+            tag = response.get_etag()[0]
+        response.set_etag(tag, weak=True)
+        response.make_conditional(request)
+        if response.status_code == 200:
+            self.compress_response(
+                response, accepted_encoding(request), (request.path, tag)
+            )
+        return response
+
+    # Compress a response body in place unless it is under min_size. With a
+    # key, each compressed variant is kept for the next identical response.
+    def compress_response(self, response, encoding, key=None):
+        response.vary.add("Accept-Encoding")
+        if encoding is None or len(response.get_data()) < self.min_size:
+            return
+        found = False
+        if key is not None:
+            found, body = self.compressed.lookup(key + (encoding,))
+        if not found:
+            body = compress(response.get_data(), encoding)
+            if key is not None:
+                self.compressed.store(key + (encoding,), body)
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+# Columns of the per-university summary shown on the map
+SUMMARY_COLUMNS = ["uni", "programmes", "total_admitted", "fee", "success_rate"]
+
+
+# Map data layer built once when the data loads. Every programme of a
+# university shares the university's coordinates, so the map shows one
+# marker per university with aggregates over the selected programmes.
+class MapLayer:
+    def __init__(self, df):
+        self.codes = df["uni"].cat.codes.to_numpy()
+        self.universities = df["uni"].cat.categories
+        n_universities = len(self.universities)
+
+        # Coordinates of each university, taken from its first row
+        valid = np.flatnonzero(self.codes >= 0)[::-1]
+        self.lat = np.full(n_universities, np.nan)
+        self.lon = np.full(n_universities, np.nan)
+        self.lat[self.codes[valid]] = df["lat"].to_numpy()[valid]
+        self.lon[self.codes[valid]] = df["lon"].to_numpy()[valid]
+
+        self.admitted = df["total_admitted"].to_numpy(dtype=np.float64)
+        self.fee = df["fee"].to_numpy(dtype=np.float64)
+        self.success_rate = df["success_rate"].to_numpy(dtype=np.float64)
+
+    # Per-university programme count, summed admitted, mean fee and mean
+    # success rate of the given row positions
+    def summarize(self, rows):
+        codes = self.codes[rows]
+        keep = codes >= 0
+        codes, rows = codes[keep], rows[keep]
+        size = len(self.universities)
+
+        count = np.bincount(codes, minlength=size)
+        admitted = np.bincount(codes, weights=self.admitted[rows], minlength=size)
+        fee = np.bincount(codes, weights=self.fee[rows], minlength=size)
+        success_rate = np.bincount(
+            codes, weights=self.success_rate[rows], minlength=size
+        )
+
+        present = np.flatnonzero(count)
+        count = count[present]
+        return pd.DataFrame(
+            {
+                "uni": self.universities[present],
+                "programmes": count,
+                "total_admitted": admitted[present].astype(np.int64),
+                "fee": fee[present] / count,
+                "success_rate": success_rate[present] / count,
+                "lat": self.lat[present],
+                "lon": self.lon[present],
+            }
+        )
@@ -0,0 +1,256 @@
+import cProfile
+import functools
+import itertools
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+
+# Prefix of every metric name in the Prometheus output
+PREFIX = "mytcas"
+
+
+# Registry of counters, gauges and summaries (count and sum of observations),
+# one series per label set, rendered in the Prometheus text format. Each
+# process has its own registry: under serve.py every worker reports the
+# requests it served.
+class Metrics:
+    def __init__(self):
+        self._types = {}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    # Picklable without the lock, so worker processes can return their metrics
+    def __getstate__(self):
+        with self._lock:
+            return {"types": dict(self._types), "series": dict(self._series)}
+
+    def __setstate__(self, state):
+        self._types = state["types"]
+        self._series = state["series"]
+        self._lock = threading.Lock()
+
+    def _update(self, kind, name, labels, update):
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._types.setdefault(name, kind)
+            series = self._series.setdefault(name, {})
+            series[key] = update(series.get(key))
+
+    def inc(self, name, value=1, **labels):
+        self._update("counter", name, labels, lambda old: (old or 0) + value)
+
+    def set(self, name, value, **labels):
+        self._update("gauge", name, labels, lambda old: value)
+
+    # Gauge keeping the largest value set so far
+    def set_max(self, name, value, **labels):
+        self._update("gauge", name, labels, lambda old: max(old or 0, value))
+
+    def observe(self, name, value, **labels):
+        self._update(
+            "summary",
+            name,
+            labels,
+            lambda old: (1, value) if old is None else (old[0] + 1, old[1] + value),
+        )
+
+    # Context manager observing the seconds its block takes
+    def timer(self, name, **labels):
+        return Timer(self, name, labels)
+
+    # Add the series of another registry, with extra labels
+    def merge(self, other, **labels):
+        extra = tuple((k, str(v)) for k, v in labels.items())
+        with other._lock:
+            series = {name: dict(values) for name, values in other._series.items()}
+            types = dict(other._types)
+        with self._lock:
+            for name, values in series.items():
+                self._types.setdefault(name, types[name])
+                target = self._series.setdefault(name, {})
+                for key, value in values.items():
+                    target[tuple(sorted(key + extra))] = value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._series):
+                kind = self._types[name]
+                metric = f"{PREFIX}_{name}"
+                lines.append(f"# TYPE {metric} {kind}")
+                for key, value in sorted(self._series[name].items()):
+                    labels = format_labels(key)
+                    if kind == "summary":
+                        lines.append(f"{metric}_count{labels} {value[0]}")
+                        lines.append(f"{metric}_sum{labels} {value[1]}")
+                    else:
+                        lines.append(f"{metric}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        with self._lock:
+            data = {
+                name: {
+                    "type": self._types[name],
+                    "series": [[dict(key), value] for key, value in values.items()],
+                }
+                for name, values in self._series.items()
+            }
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path):
+        metrics = cls()
+        with open(path) as f:
+            data = json.load(f)
+        for name, family in data.items():
+            metrics._types[name] = family["type"]
+            metrics._series[name] = {
+                tuple(sorted(labels.items())): tuple(value)
+                if isinstance(value, list)
+                else value
+                for labels, value in family["series"]
+            }
+        return metrics
+
+
+class Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.seconds, **self.labels)
+
+
+# {name="value",...} with backslashes, quotes and newlines escaped
+def format_labels(key):
+    if not key:
+        return ""
+    pairs = []
+    for name, value in key:
+        value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+# Peak resident memory of the process (bytes) since the last reset. On Linux
+# the high-water mark can be reset, so it measures a single stage; elsewhere
+# it is the peak of the whole process.
+class PeakMemory:
+    def reset(self):
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    def peak(self):
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Opt-in profiling: every profiled block is dumped to directory as a cProfile
+# file (open it with pstats or snakeviz) and a tracemalloc snapshot of the
+# memory allocated at its end (tracemalloc.Snapshot.load). Only one block is
+# profiled at a time: since Python 3.12 a second cProfile.Profile enabled while
+# one is running raises "Another profiling tool is already active", so start()
+# returns None for a block overlapping another one (a concurrent request).
+class Profiler:
+    def __init__(self, directory):
+        self.directory = directory
+        self._numbers = itertools.count(1)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def start(self):
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+        except BaseException:
+            self._lock.release()
+            raise
+        return profile
+
+    def stop(self, profile, name):
+        try:
+            profile.disable()
+            stem = os.path.join(self.directory, f"{next(self._numbers):05d}-{name}")
+            profile.dump_stats(stem + ".prof")
+            tracemalloc.take_snapshot().dump(stem + ".tracemalloc")
+        finally:
+            self._lock.release()
+
+
+# Metrics of the data preparation stages, written next to the output
+PIPELINE = Metrics()
+# Set by data_preparation --profile
+pipeline_profiler = None
+_peak_memory = PeakMemory()
+
+
+# File the pipeline metrics of an output dataset are written to
+def metrics_path(output_path):
+    return os.path.splitext(output_path)[0] + ".metrics.json"
+
+
+def count_rows(value):
+    if isinstance(value, tuple):
+        value = value[0]
+    return len(value) if hasattr(value, "__len__") else 0
+
+
+# Decorator recording the wall time, rows in and out and peak memory of a
+# pipeline stage. The first argument of the stage is its input frame.
+def pipeline_stage(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(df, *args, **kwargs):
+            profiler = pipeline_profiler
+            profile = profiler.start() if profiler else None
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            _peak_memory.reset()
+            with PIPELINE.timer("pipeline_stage_seconds", stage=name) as timer:
+                result = func(df, *args, **kwargs)
+            peak = _peak_memory.peak()
+            if profile is not None:
+                profiler.stop(profile, name)
+
+            rows_in = count_rows(df)
+            rows_out = rows_in if result is None else count_rows(result)
+            PIPELINE.inc("pipeline_stage_rows_in", rows_in, stage=name)
+            PIPELINE.inc("pipeline_stage_rows_out", rows_out, stage=name)
+            PIPELINE.set_max("pipeline_stage_peak_rss_bytes", peak, stage=name)
+            if tracemalloc.is_tracing():
+                traced = tracemalloc.get_traced_memory()[1]
+                PIPELINE.set_max("pipeline_stage_peak_traced_bytes", traced, stage=name)
+            print(
+                f"{name}: {timer.seconds:.3f}s, {rows_in} -> {rows_out} rows,"
+                f" peak {peak / 1024 / 1024:.1f}MB"
+            )
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from filter_engine import FilterEngine
+
+
+# Cascading dropdown options built once when the data loads. The distinct
+# (uni, major, course) combinations are the edges of the uni -> major ->
+# course adjacency, indexed per value like the rows in FilterEngine, so
+# narrowing a dropdown by the other two intersects a few arrays of
+# combinations instead of filtering the rows.
+class OptionIndex:
+    def __init__(self, df, columns=("uni", "major", "course")):
+        combinations = df[list(columns)].drop_duplicates(ignore_index=True)
+        self.engine = FilterEngine(combinations, columns)
+        # Value codes of every combination, numbered in order of first
+        # appearance as in the unfiltered dropdowns
+        self.codes = {}
+        self.values = {}
+        for column in columns:
+            codes, uniques = pd.factorize(combinations[column], sort=False)
+            self.codes[column] = codes
+            self.values[column] = np.asarray(uniques, dtype=object)
+
+    # Values of a column present in the given combinations
+    def values_in(self, column, combinations):
+        if len(combinations) == len(self.codes[column]):
+            return list(self.values[column])
+        codes = np.unique(self.codes[column][combinations])
+        return list(self.values[column][codes[codes >= 0]])
+
+    # Options of each dropdown narrowed by the selection of the other two
+    def narrow(self, selected_university, selected_major, selected_course):
+        select = self.engine.select
+        return {
+            "uni": self.values_in(
+                "uni", select(["all"], selected_major, selected_course)
+            ),
+            "major": self.values_in(
+                "major", select(selected_university, "all", selected_course)
+            ),
+            "course": self.values_in(
+                "course", select(selected_university, selected_major, "all")
+            ),
+        }
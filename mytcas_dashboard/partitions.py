@@ -0,0 +1,154 @@
+import functools
+import threading
+from collections import OrderedDict
+
+from aggregate_cube import AggregateCube, cube_cells
+from data_loader import (
+    dataset_version,
+    load_cube_cells,
+    load_dataset,
+    load_province_table,
+)
+from filter_engine import FilterEngine
+from map_layer import MapLayer
+from option_index import OptionIndex
+from search_index import SearchIndex
+from table_query import build_sort_ranks
+
+
+# Dataset of one admission year with the indexes the callbacks use, built
+# when the year is first requested
+class Partition:
+    def __init__(self, year, path):
+        self.year = year
+        self.path = path
+        self.version = dataset_version(path)
+        self.df = load_dataset(path)
+        self.engine = FilterEngine(self.df)
+        self.options = OptionIndex(self.df)
+        self.cube = AggregateCube(cube_cells(self.df))
+        self.map_layer = MapLayer(self.df)
+        # Columns shown in the data table and their precomputed sort orders
+        self.table_columns = list(self.df.columns.drop("total_admitted"))
+        self.sort_ranks = build_sort_ranks(self.df, self.table_columns)
+        # Seats against students per province, precomputed by data_preparation
+        self.provinces = load_province_table(path)
+
+        # Approximate in-memory size: the frame plus the per-row indexes and
+        # the cube
+        self.nbytes = int(self.df.memory_usage(deep=True).sum())
+        self.nbytes += self.cube.nbytes
+        for index in self.engine.index.values():
+            self.nbytes += sum(rows.nbytes for rows in index.values())
+        self.nbytes += sum(ranks.nbytes for ranks in self.sort_ranks.values())
+
+    # N-gram index of the course, major and minor names, built on the first
+    # search so it does not delay the first page
+    @functools.cached_property
+    def search(self):
+        return SearchIndex(self.df)
+
+
+# Year partitions loaded lazily on first access and kept in least recently
+# used order. The aggregate cube of a year whose partition is not loaded is
+# built from the cells data_preparation writes next to the dataset, so
+# year-over-year totals do not load (or reload evicted) years. Such cubes
+# count against memory_budget (bytes) along with the loaded partitions:
+# loading a year or a cube evicts the least recently used cubes, then the
+# least recently used partitions (with their cubes), while over the budget.
+# The requested year and the most recently used partition (the year being
+# viewed) are always kept.
+class PartitionStore:
+    def __init__(self, paths, memory_budget):
+        self.paths = dict(paths)
+        self.years = sorted(self.paths)
+        self.memory_budget = memory_budget
+        self.loads = 0
+        self.evictions = 0
+        self._partitions = OrderedDict()
+        self._cubes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def nbytes(self):
+        return sum(
+            partition.nbytes for partition in self._partitions.values()
+        ) + sum(cube.nbytes for cube in self._cubes.values())
+
+    # Evict cubes, then partitions, least recently used first while over the
+    # memory budget, except those of the year just used and the most recently
+    # used partition
+    def _evict(self, year):
+        kept = {year, next(reversed(self._partitions), None)}
+        for entries in (self._cubes, self._partitions):
+            while self.nbytes() > self.memory_budget:
+                evicted = next((other for other in entries if other not in kept), None)
+                if evicted is None:
+                    break
+                del entries[evicted]
+                self.evictions += 1
+
+    # Partition of a year, loading it on first access
+    def get(self, year):
+        with self._lock:
+            partition = self._partitions.get(year)
+            if partition is None:
+                partition = Partition(year, self.paths[year])
+                self.loads += 1
+                self._partitions[year] = partition
+                # The partition has the same cube
+                self._cubes.pop(year, None)
+            self._partitions.move_to_end(year)
+            self._evict(year)
+            return partition
+
+    # Load years newest first while they fit in the memory budget, e.g. before
+    # forking workers so that they all share the loaded partitions
+    def preload(self):
+        with self._lock:
+            for year in reversed(self.years):
+                if year in self._partitions:
+                    continue
+                partition = Partition(year, self.paths[year])
+                if self._partitions and (
+                    self.nbytes() + partition.nbytes > self.memory_budget
+                ):
+                    break
+                self.loads += 1
+                self._partitions[year] = partition
+                self._partitions.move_to_end(year, last=False)
+                self._cubes.pop(year, None)
+
+    # Aggregate cube of a year: the cube of its partition when it is loaded,
+    # otherwise built from its cube cells. Datasets prepared without them
+    # fall back to loading the partition.
+    def cube(self, year):
+        with self._lock:
+            partition = self._partitions.get(year)
+            cube = self._cubes.get(year)
+            if partition is not None:
+                self._partitions.move_to_end(year)
+                return partition.cube
+            if cube is not None:
+                self._cubes.move_to_end(year)
+                return cube
+        cells = load_cube_cells(self.paths[year])
+        if cells is None:
+            return self.get(year).cube
+        cube = AggregateCube(cells)
+        with self._lock:
+            if year not in self._partitions:
+                cube = self._cubes.setdefault(year, cube)
+                self._cubes.move_to_end(year)
+                self._evict(year)
+        return cube
+
+    def stats(self):
+        return {
+            "years": self.years,
+            "loaded": list(self._partitions),
+            "cubes": list(self._cubes),
+            "nbytes": self.nbytes(),
+            "memory_budget": self.memory_budget,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,103 @@
+import ast
+import json
+
+import numpy as np
+import pandas as pd
+
+from data_loader import ROUND_COLUMNS
+
+# Mathayom 6 (graduating) student counts of data/data.json
+STUDENT_COLUMNS = ["totalstd", "totalmale", "totalfemale"]
+STUDENT_LEVEL = "ม.6"
+
+
+# Province centroids of data/province.py as a DataFrame indexed by province.
+# The dict is read as a literal, the file is never executed.
+def load_province_coords(path="data/province.py"):
+    with open(path, encoding="utf-8") as f:
+        module = ast.parse(f.read())
+    for node in module.body:
+        if isinstance(node, ast.Assign) and any(
+            getattr(target, "id", None) == "province_coords"
+            for target in node.targets
+        ):
+            coords = ast.literal_eval(node.value)
+            return pd.DataFrame.from_dict(coords, orient="index")[["lat", "lon"]]
+    raise ValueError(f"no province_coords in {path}")
+
+
+# Mathayom 6 students per province in an admission year. Years without
+# counts use the latest earlier year (or the earliest year) that has them.
+def load_students(path="data/data.json", year=None):
+    with open(path, encoding="utf-8") as f:
+        students = pd.DataFrame(json.load(f))
+    students = students[students["level"] == STUDENT_LEVEL]
+    years = sorted(students["pp3year"].unique())
+    if str(year) not in years:
+        earlier = [y for y in years if y < str(year)]
+        used = earlier[-1] if earlier else years[0]
+        print(f"No student counts for {year}, using {used}")
+        year = used
+    students = students[students["pp3year"] == str(year)]
+    return students.set_index("schools_province")[STUDENT_COLUMNS].astype(int)
+
+
+# Province of the nearest centroid to every point, by distance on an
+# equirectangular projection (longitude differences scaled by the cosine of
+# the mean latitude), which is accurate enough at the scale of Thailand.
+# Points without coordinates get None.
+def nearest_province(lat, lon, coords):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))[:, None]
+    lon = np.radians(np.asarray(lon, dtype=np.float64))[:, None]
+    province_lat = np.radians(coords["lat"].to_numpy(dtype=np.float64))
+    province_lon = np.radians(coords["lon"].to_numpy(dtype=np.float64))
+    dlat = lat - province_lat
+    dlon = (lon - province_lon) * np.cos((lat + province_lat) / 2)
+    distance = dlat**2 + dlon**2
+    provinces = coords.index.to_numpy(dtype=object)[
+        np.argmin(np.nan_to_num(distance, nan=np.inf), axis=1)
+    ]
+    provinces[np.isnan(distance[:, 0])] = None
+    return provinces
+
+
+# Per university: its coordinates (the first known), the seats of every round
+# and the number of programmes. Totals of parts of a dataset are added up by
+# combine_university_totals.
+def university_totals(df):
+    groups = df.groupby("uni", sort=False, observed=True)
+    totals = groups[["lat", "lon"]].first()
+    totals[ROUND_COLUMNS] = groups[ROUND_COLUMNS].sum()
+    totals["programmes"] = groups.size()
+    return totals
+
+
+def combine_university_totals(parts):
+    groups = pd.concat(parts).groupby(level=0, sort=False)
+    totals = groups[["lat", "lon"]].first()
+    counts = ROUND_COLUMNS + ["programmes"]
+    totals[counts] = groups[counts].sum()
+    return totals
+
+
+# Admission seats of every round per province (each university counted in
+# the province nearest to it) against the Mathayom 6 students of the
+# province, from the university_totals of a dataset
+def build_province_table(universities, coords, students):
+    universities = universities.assign(
+        province=nearest_province(universities["lat"], universities["lon"], coords)
+    )
+    by_province = universities.groupby("province")
+
+    table = coords.join(students, how="left")
+    table = table.join(by_province[ROUND_COLUMNS].sum(), how="left")
+    table["universities"] = by_province.size()
+    table["programmes"] = by_province["programmes"].sum()
+    counts = STUDENT_COLUMNS + ROUND_COLUMNS + ["universities", "programmes"]
+    table[counts] = table[counts].fillna(0).astype(int)
+    table["seats"] = table[ROUND_COLUMNS].sum(axis=1)
+    table["seats_per_100_students"] = (
+        100 * table["seats"] / table["totalstd"].replace(0, np.nan)
+    ).round(2)
+    table.index.name = "province"
+    return table.reset_index()
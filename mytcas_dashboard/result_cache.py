@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+# Bounded LRU cache with optional time-to-live and hit/miss counters, used to
+# memoize callback results per normalized filter state
+class ResultCache:
+    def __init__(self, maxsize=256, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Return (True, value) for a live entry, otherwise (False, None)
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return False, None
+
+    # Store a value, evicting the least recently used entries over maxsize
+    def store(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    # Decorator: memoize a function under key(*args)
+    def memoize(self, key):
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args):
+                cache_key = key(*args)
+                found, value = self.lookup(cache_key)
+                if not found:
+                    value = func(*args)
+                    self.store(cache_key, value)
+                return value
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,134 @@
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Lowercased NFC text with runs of whitespace collapsed, so a query matches
+# however the scraped text was composed and spaced
+def normalize(text):
+    return " ".join(unicodedata.normalize("NFC", str(text)).casefold().split())
+
+
+# Character n-gram index over the distinct values of some text columns. Thai
+# has no spaces between words, so instead of words every value is indexed by
+# its overlapping n-character substrings. A query term of at least n
+# characters only checks the values holding all of its n-grams (the
+# intersection of their posting lists); shorter terms scan the values.
+class SearchIndex:
+    def __init__(self, df, columns=("course", "major", "minor"), n=3):
+        self.columns = list(columns)
+        self.n = n
+        column_codes = []
+        values = []
+        for code, column in enumerate(self.columns):
+            if column not in df.columns:
+                continue
+            uniques = pd.unique(df[column].dropna())
+            values.extend(str(value) for value in uniques)
+            column_codes.extend([code] * len(uniques))
+        # Documents: (column, value) pairs, numbered in column order then in
+        # order of first appearance
+        self.column_codes = np.asarray(column_codes, dtype=np.int8)
+        self.values = np.asarray(values, dtype=object)
+        self.keys = [normalize(value) for value in values]
+
+        # Posting lists: sorted document numbers of every n-gram
+        grams = []
+        documents = []
+        for document, key in enumerate(self.keys):
+            key_grams = {key[i : i + n] for i in range(len(key) - n + 1)}
+            grams.extend(key_grams)
+            documents.extend([document] * len(key_grams))
+        gram_codes, uniques = pd.factorize(pd.Series(grams, dtype=object))
+        order = np.argsort(gram_codes, kind="stable")
+        bounds = np.searchsorted(gram_codes[order], np.arange(len(uniques) + 1))
+        documents = np.asarray(documents, dtype=np.int32)[order]
+        self.postings = {
+            gram: documents[bounds[i] : bounds[i + 1]]
+            for i, gram in enumerate(uniques)
+        }
+
+    def __len__(self):
+        return len(self.values)
+
+    # Documents that may contain a term: every document holding all of its
+    # n-grams, rarest n-gram first
+    def _candidates(self, term):
+        if len(term) < self.n:
+            return None
+        grams = {term[i : i + self.n] for i in range(len(term) - self.n + 1)}
+        postings = sorted(
+            (self.postings.get(gram, np.empty(0, np.int32)) for gram in grams),
+            key=len,
+        )
+        documents = postings[0]
+        for posting in postings[1:]:
+            if not len(documents):
+                break
+            documents = np.intersect1d(documents, posting, assume_unique=True)
+        return documents
+
+    # Document numbers matching every whitespace-separated term of a query,
+    # best first: values equal to the query, then values starting with it,
+    # then by where the first term appears and by length. An empty query
+    # matches every document in order.
+    def search(self, query, column=None):
+        terms = normalize(query).split()
+        if column is None:
+            allowed = None
+        elif column in self.columns:
+            allowed = self.columns.index(column)
+        else:
+            return []
+        if not terms:
+            documents = np.arange(len(self.values))
+            if allowed is not None:
+                documents = documents[self.column_codes == allowed]
+            return documents.tolist()
+
+        candidates = None
+        for term in sorted(terms, key=len, reverse=True):
+            documents = self._candidates(term)
+            if documents is None:
+                continue
+            candidates = (
+                documents
+                if candidates is None
+                else np.intersect1d(candidates, documents, assume_unique=True)
+            )
+        if candidates is None:
+            candidates = np.arange(len(self.values))
+        if allowed is not None:
+            candidates = candidates[self.column_codes[candidates] == allowed]
+
+        query = " ".join(terms)
+        ranked = []
+        for document in candidates.tolist():
+            key = self.keys[document]
+            if all(term in key for term in terms):
+                ranked.append(
+                    (
+                        key != query,
+                        not key.startswith(query),
+                        key.find(terms[0]),
+                        len(key),
+                        document,
+                    )
+                )
+        ranked.sort()
+        return [rank[-1] for rank in ranked]
+
+    # One page of matches as {"column", "value"} records, with the number of
+    # matches
+    def page(self, query, column=None, page=0, page_size=20):
+        documents = self.search(query, column)
+        start = page * page_size
+        results = [
+            {
+                "column": self.columns[self.column_codes[document]],
+                "value": self.values[document],
+            }
+            for document in documents[start : start + page_size]
+        ]
+        return results, len(documents)
@@ -0,0 +1,99 @@
+import argparse
+import gc
+import logging
+import os
+import signal
+
+from werkzeug.serving import make_server
+
+from app import create_app
+
+
+# Create the app with its data loaded: the latest years that fit in the
+# memory budget with their search indexes, and the layout. Under gunicorn,
+# preload it in the master so the workers share it:
+#   gunicorn --preload -w 4 -b 0.0.0.0:8080 "serve:load_app()"
+def load_app(config=None):
+    app = create_app({**(config or {}), "preload": True})
+    app.partitions.preload()
+    for year in app.partitions.stats()["loaded"]:
+        app.partitions.get(year).search
+    return app.server
+
+
+# Pre-fork server: load the app and bind the socket once, then fork workers
+# that accept connections on the shared socket. The workers share the loaded
+# data copy-on-write (and the page cache of memory-mapped Arrow files), so
+# memory does not grow with the number of workers. Dead workers are replaced.
+def serve(host="0.0.0.0", port=8080, workers=None, config=None):
+    workers = workers or os.cpu_count() or 1
+    server = make_server(host, port, load_app(config), threaded=True)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    # Keep the garbage collector from writing to the shared objects
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                # Exited already, os.wait collects it
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        # A worker stopped on purpose (SIGTERM or SIGINT, e.g. a Ctrl-C sent
+        # to the process group) is not replaced
+        stopped = os.WIFSIGNALED(status) and os.WTERMSIG(status) in (
+            signal.SIGTERM,
+            signal.SIGINT,
+        )
+        if not stopping and not stopped:
+            print(f"Worker {pid} exited, starting a new one")
+            spawn()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the dashboard")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers", type=int, help="worker processes (default: number of CPUs)"
+    )
+    parser.add_argument("--data-dir", help="default: the repository's data/")
+    parser.add_argument("--memory-budget", type=int, help="MB of loaded years")
+    args = parser.parse_args()
+
+    config = {}
+    if args.data_dir:
+        config["data_dir"] = args.data_dir
+    if args.memory_budget:
+        config["memory_budget"] = args.memory_budget
+    serve(args.host, args.port, args.workers, config)
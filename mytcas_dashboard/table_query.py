@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Operators of the DataTable filter_query syntax, longest first
+FILTER_OPERATORS = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+# Operators matching the text of a value
+TEXT_OPERATORS = ["contains", "datestartswith"]
+# Case prefixes the DataTable puts before every operator of a column with
+# filter_options: "s" (case-sensitive) and "i" (case-insensitive)
+CASE_PREFIXES = ["s", "i"]
+
+
+# Dense rank of every row in the ascending order of each column. Sorting a
+# selection then only argsorts small integers instead of long Thai strings.
+def build_sort_ranks(df, columns):
+    ranks = {}
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        ranks[column], _ = pd.factorize(values, sort=True)
+    return ranks
+
+
+# Split one "{column} operator value" part of a filter_query into the column,
+# the operator, the value and whether text is compared case-sensitively. The
+# operator is the one right after the closing brace of the column, so an
+# operator word inside the column or the value is never taken for it, and may
+# carry a case prefix ("{uni} icontains x", "{fee} s> 400000"). Values of text
+# operators stay strings, "contains 1.50" must not become 1.5.
+def split_filter_part(filter_part):
+    name_start = filter_part.find("{")
+    name_end = filter_part.find("}", name_start + 1)
+    if name_start < 0 or name_end < 0:
+        return None, None, None, True
+    name = filter_part[name_start + 1 : name_end]
+    rest = filter_part[name_end + 1 :].lstrip()
+    case_sensitive = True
+    # No operator starts with a prefix letter
+    if rest[:1] in CASE_PREFIXES:
+        case_sensitive = rest[0] == "s"
+        rest = rest[1:]
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if rest.startswith(operator):
+                value_part = rest[len(operator) :].strip()
+                # word operators need spaces after them in the filter string,
+                # but we don't want these later
+                operator = operator_type[0].strip()
+                v0 = value_part[0] if value_part else ""
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + v0, v0)
+                elif operator in TEXT_OPERATORS:
+                    value = value_part
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator, value, case_sensitive
+
+    return None, None, None, True
+
+
+# Boolean mask of the values of one column matching a filter expression.
+# Without case_sensitive, text is compared casefolded.
+def match(series, operator, value, case_sensitive=True):
+    if not pd.api.types.is_numeric_dtype(series) or operator in TEXT_OPERATORS:
+        series = series.astype(str)
+        value = str(value)
+        if not case_sensitive:
+            series = series.str.casefold()
+            value = value.casefold()
+    if operator == "contains":
+        return series.str.contains(value, regex=False).to_numpy()
+    if operator == "datestartswith":
+        return series.str.startswith(value).to_numpy()
+    if isinstance(value, str) and pd.api.types.is_numeric_dtype(series):
+        return np.zeros(len(series), dtype=bool)
+    comparisons = {
+        "eq": series.__eq__,
+        "ne": series.__ne__,
+        "lt": series.__lt__,
+        "le": series.__le__,
+        "gt": series.__gt__,
+        "ge": series.__ge__,
+    }
+    return comparisons[operator](value).to_numpy()
+
+
+# Narrow row positions down to those matching every part of a filter_query.
+# Categorical columns are matched once per category, then by code.
+def apply_filter_query(df, rows, filter_query):
+    if not filter_query:
+        return rows
+    for filter_part in filter_query.split(" && "):
+        name, operator, value, case_sensitive = split_filter_part(filter_part)
+        if name not in df.columns:
+            continue
+        column = df[name]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories = pd.Series(column.cat.categories)
+            matched = match(categories, operator, value, case_sensitive)
+            codes = column.cat.codes.to_numpy()[rows]
+            keep = np.zeros(len(rows), dtype=bool)
+            valid = codes >= 0
+            keep[valid] = matched[codes[valid]]
+        else:
+            keep = match(column.iloc[rows], operator, value, case_sensitive)
+        rows = rows[keep]
+    return rows
+
+
+# Order row positions by the DataTable sort_by list using the precomputed ranks
+def apply_sort_by(ranks, rows, sort_by):
+    for sort in reversed(sort_by or []):
+        rank = ranks.get(sort["column_id"])
+        if rank is None:
+            continue
+        keys = rank[rows]
+        if sort["direction"] == "desc":
+            keys = -keys
+        rows = rows[np.argsort(keys, kind="stable")]
+    return rows
+
+
+# Records of one page of the given row positions
+def page_records(df, rows, columns, page_current, page_size):
+    start = page_current * page_size
+    page_rows = rows[start : start + page_size]
+    return df.iloc[page_rows][columns].to_dict("records")